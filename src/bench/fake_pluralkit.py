@@ -0,0 +1,203 @@
+from argparse import ArgumentParser
+from asyncio import Event, run, sleep
+from bisect import bisect_left
+from collections.abc import Iterable
+from random import Random
+
+from aiohttp import web
+
+from utils.constants import (
+    PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE,
+    PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND,
+    PLURALKIT_SWITCH_PAGE_SIZE,
+)
+from utils.functions import format_timestamp, unix_to_rfc3399
+
+
+__all__: tuple[str, ...] = (
+    "FakePluralKit",
+)
+
+
+_HISTORY_END: float = 1_700_000_000.0  # every synthetic switch history ends here
+
+
+class FakePluralKit:
+    __slots__: tuple[str, ...] = (
+        'members_per_system',
+        'switches_per_system',
+        'switch_interval',
+        'latency',
+        'private_systems',
+        'missing_systems',
+        'rate_limit_every',
+        'requests',
+        'rate_limited',
+        '_systems',
+        '_runner',
+    )
+
+    def __init__(
+        self,
+        *,
+        members_per_system: int = 50,
+        switches_per_system: int = 500,
+        switch_interval: float = 3600.0,
+        latency: float = 0.0,
+        private_systems: Iterable[int] = (),
+        missing_systems: Iterable[int] = (),
+        rate_limit_every: int = 0,
+    ) -> None:
+        self.members_per_system = members_per_system
+        self.switches_per_system = switches_per_system
+        self.switch_interval = switch_interval
+        self.latency = latency
+        self.private_systems = set(private_systems)
+        self.missing_systems = set(missing_systems)
+        self.rate_limit_every = rate_limit_every
+        self.requests: dict[str, int] = {}
+        self.rate_limited = 0
+        self._systems: dict[int, tuple[list[dict], list[dict], list[float]]] = {}
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def history_start(self) -> float:
+        return _HISTORY_END - self.switches_per_system * self.switch_interval
+
+    def system(self, system_id: int) -> tuple[list[dict], list[dict], list[float]]:
+        # Generated on first use from the system id, so every run sees the same data.
+        cached = self._systems.get(system_id)
+        if cached is not None:
+            return cached
+
+        rng = Random(system_id)
+        members = [
+            {
+                'id': f"m{index:05d}",
+                'name': f"Member {index}",
+                'display_name': f"Display {index}" if rng.random() < 0.5 else None,
+                'privacy': {'visibility': 'private' if rng.random() < 0.1 else 'public'},
+                'message_count': rng.randrange(0, 100_000),
+            } for index in range(self.members_per_system)
+        ]
+        member_ids = [member['id'] for member in members]
+        # Oldest first, alongside their unix timestamps for bisecting `before`.
+        timestamps = [self.history_start + (index + 1) * self.switch_interval for index in range(self.switches_per_system)]
+        switches = [
+            {
+                'id': f"s{system_id}-{index}",
+                'timestamp': unix_to_rfc3399(timestamp),
+                'members': rng.sample(member_ids, min(rng.randint(0, 3), len(member_ids))),
+            } for index, timestamp in enumerate(timestamps)
+        ]
+        self._systems[system_id] = (members, switches, timestamps)
+        return members, switches, timestamps
+
+    def _count(self, route: str) -> int:
+        self.requests[route] = self.requests.get(route, 0) + 1
+        return sum(self.requests.values())
+
+    async def _respond(self, request: web.Request, route: str) -> web.Response | None:
+        total = self._count(route)
+        if self.latency > 0:
+            await sleep(self.latency)
+        if self.rate_limit_every > 0 and total % self.rate_limit_every == 0:
+            self.rate_limited += 1
+            return web.json_response({'message': "429: too many requests", 'retry_after': 100, 'code': 0}, status=429)
+
+        system_id = int(request.match_info['system_id'])
+        if system_id in self.missing_systems:
+            return web.json_response({'message': "System not found.", 'code': PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND}, status=404)
+        if (
+            route != 'members'
+            and system_id in self.private_systems
+            and 'Authorization' not in request.headers
+        ):
+            return web.json_response(
+                {'message': "Unauthorized to view front history.", 'code': PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE},
+                status=403,
+            )
+        return None
+
+    async def members(self, request: web.Request) -> web.Response:
+        error = await self._respond(request, 'members')
+        if error is not None:
+            return error
+        members, _, _ = self.system(int(request.match_info['system_id']))
+        return web.json_response(members)
+
+    async def switches(self, request: web.Request) -> web.Response:
+        error = await self._respond(request, 'switches')
+        if error is not None:
+            return error
+        _, switches, timestamps = self.system(int(request.match_info['system_id']))
+        limit = min(int(request.query.get('limit', PLURALKIT_SWITCH_PAGE_SIZE)), PLURALKIT_SWITCH_PAGE_SIZE)
+        before = request.query.get('before')
+        end = len(switches) if before is None else bisect_left(timestamps, format_timestamp(before).timestamp())
+        # Newest first, as the API returns them.
+        return web.json_response(switches[max(end - limit, 0):end][::-1])
+
+    async def switch(self, request: web.Request) -> web.Response:
+        error = await self._respond(request, 'switch')
+        if error is not None:
+            return error
+        members, switches, _ = self.system(int(request.match_info['system_id']))
+        switch = next((s for s in switches if s['id'] == request.match_info['switch_id']), None)
+        if switch is None:
+            return web.json_response({'message': "Switch not found.", 'code': 20006}, status=404)
+        by_id = {member['id']: member for member in members}
+        return web.json_response({**switch, 'members': [by_id[member_id] for member_id in switch['members']]})
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get('/v2/systems/{system_id}/members', self.members)
+        app.router.add_get('/v2/systems/{system_id}/switches', self.switches)
+        app.router.add_get('/v2/systems/{system_id}/switches/{switch_id}', self.switch)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        return f"http://{bound_host}:{bound_port}"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve(fake: FakePluralKit, host: str, port: int) -> None:
+    url = await fake.start(host, port)
+    print(f"Fake PluralKit API listening on {url} (set PLURALKIT_API_URL to use it)")
+    try:
+        await Event().wait()
+    finally:
+        await fake.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serve a synthetic PluralKit API for offline runs and benchmarks.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--members', type=int, default=50, help="members in every system")
+    parser.add_argument('--switches', type=int, default=500, help="switches in every system")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--private', type=int, nargs='*', default=(), help="system ids with a private front history")
+    parser.add_argument('--missing', type=int, nargs='*', default=(), help="system ids that aren't registered")
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="answer every Nth request with a 429")
+    args = parser.parse_args()
+    try:
+        run(_serve(
+            FakePluralKit(
+                members_per_system=args.members,
+                switches_per_system=args.switches,
+                latency=args.latency,
+                private_systems=args.private,
+                missing_systems=args.missing,
+                rate_limit_every=args.rate_limit_every,
+            ),
+            args.host,
+            args.port,
+        ))
+    except KeyboardInterrupt:
+        pass
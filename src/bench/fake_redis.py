@@ -0,0 +1,120 @@
+from argparse import ArgumentParser
+from asyncio import Event, IncompleteReadError, Server, StreamReader, StreamWriter, run, start_server
+from time import monotonic
+
+
+__all__: tuple[str, ...] = (
+    "FakeRedis",
+)
+
+
+class FakeRedis:
+    # Just enough of the Redis protocol for the shared cache backend: GET, SET with PX, DEL, PUBLISH and
+    # SUBSCRIBE, so multi-process runs can be tried without installing redis-server.
+    __slots__: tuple[str, ...] = (
+        'commands',
+        '_entries',
+        '_subscribers',
+        '_server',
+    )
+
+    def __init__(self) -> None:
+        self.commands: dict[str, int] = {}
+        self._entries: dict[bytes, tuple[bytes, float]] = {}
+        self._subscribers: dict[bytes, set[StreamWriter]] = {}
+        self._server: Server | None = None
+
+    @staticmethod
+    def _bulk(value: bytes | None) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    @classmethod
+    def _array(cls, values: list[bytes]) -> bytes:
+        return b"*%d\r\n" % len(values) + b"".join(cls._bulk(value) for value in values)
+
+    @staticmethod
+    async def _read_command(reader: StreamReader) -> list[bytes]:
+        header = await reader.readline()
+        if not header.startswith(b"*"):
+            raise IncompleteReadError(header, None)
+        args: list[bytes] = []
+        for _ in range(int(header[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    def _execute(self, args: list[bytes], writer: StreamWriter) -> bytes:
+        name = args[0].upper().decode()
+        self.commands[name] = self.commands.get(name, 0) + 1
+        if name in ('PING', 'AUTH', 'SELECT'):
+            return b"+OK\r\n"
+        if name == 'GET':
+            entry = self._entries.get(args[1])
+            if entry is not None and monotonic() >= entry[1]:
+                del self._entries[args[1]]
+                entry = None
+            return self._bulk(None if entry is None else entry[0])
+        if name == 'SET':
+            expires_at = float('inf')
+            if len(args) >= 5 and args[3].upper() == b"PX":
+                expires_at = monotonic() + int(args[4]) / 1000
+            self._entries[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if name == 'DEL':
+            return b":%d\r\n" % sum(self._entries.pop(key, None) is not None for key in args[1:])
+        if name == 'PUBLISH':
+            subscribers = self._subscribers.get(args[1], set())
+            for subscriber in subscribers:
+                subscriber.write(self._array([b"message", args[1], args[2]]))
+            return b":%d\r\n" % len(subscribers)
+        if name == 'SUBSCRIBE':
+            replies: list[bytes] = []
+            for channel in args[1:]:
+                self._subscribers.setdefault(channel, set()).add(writer)
+                replies.append(b"*3\r\n" + self._bulk(b"subscribe") + self._bulk(channel) + b":1\r\n")
+            return b"".join(replies)
+        return b"-ERR unknown command '%s'\r\n" % name.encode()
+
+    async def _handle(self, reader: StreamReader, writer: StreamWriter) -> None:
+        try:
+            while True:
+                writer.write(self._execute(await self._read_command(reader), writer))
+        except (IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            for subscribers in self._subscribers.values():
+                subscribers.discard(writer)
+            writer.close()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self._server = await start_server(self._handle, host, port)
+        bound_host, bound_port = self._server.sockets[0].getsockname()[:2]
+        return f"redis://{bound_host}:{bound_port}"
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+
+async def _serve(host: str, port: int) -> None:
+    fake = FakeRedis()
+    url = await fake.start(host, port)
+    print(f"Fake Redis listening on {url} (set CACHE_BACKEND_URL to use it)")
+    try:
+        await Event().wait()
+    finally:
+        await fake.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serve a minimal in-process Redis stand-in for the shared cache backend.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+    try:
+        run(_serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,225 @@
+from argparse import ArgumentParser, Namespace
+from asyncio import Semaphore, gather, get_running_loop, run
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from os import environ
+from random import Random
+from statistics import median, quantiles
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any
+
+from bench.fake_pluralkit import FakePluralKit
+from bench.fake_redis import FakeRedis
+
+
+class _User:
+    __slots__: tuple[str, ...] = (
+        'id',
+        'mention',
+    )
+
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.mention = f"<@{id}>"
+
+
+class _Interaction:
+    # Just the surface the cogs touch, so commands run without Discord.
+    __slots__: tuple[str, ...] = (
+        'user',
+        'response',
+        'replies',
+    )
+
+    def __init__(self, user_id: int) -> None:
+        self.user = _User(user_id)
+        self.response = _Response(self)
+        self.replies: list[str | None] = []
+
+    async def edit_original_response(self, content: str | None = None, **kwargs: Any) -> None:
+        self.replies.append(content)
+
+
+class _Response:
+    __slots__: tuple[str, ...] = (
+        'interaction',
+    )
+
+    def __init__(self, interaction: _Interaction) -> None:
+        self.interaction = interaction
+
+    async def defer(self, **kwargs: Any) -> None:
+        pass
+
+    async def send_message(self, content: str | None = None, **kwargs: Any) -> None:
+        self.interaction.replies.append(content)
+
+
+class _Result:
+    __slots__: tuple[str, ...] = (
+        'name',
+        'latencies',
+        'elapsed',
+        'upstream',
+        'db_reads',
+        'db_writes',
+    )
+
+    def __init__(self, name: str, latencies: list[float], elapsed: float, upstream: int, db_reads: int, db_writes: int) -> None:
+        self.name = name
+        self.latencies = latencies
+        self.elapsed = elapsed
+        self.upstream = upstream
+        self.db_reads = db_reads
+        self.db_writes = db_writes
+
+    def row(self) -> str:
+        count = len(self.latencies)
+        p99 = quantiles(self.latencies, n=100)[98] if count > 1 else self.latencies[0]
+        return (
+            f"{self.name:<22} {count:>6} {count / self.elapsed:>9.1f} "
+            f"{median(self.latencies) * 1000:>8.2f} {p99 * 1000:>8.2f} "
+            f"{self.upstream / count:>9.2f} {self.db_reads / count:>8.2f} {self.db_writes / count:>8.2f}"
+        )
+
+
+_HEADER: str = (
+    f"{'scenario':<22} {'ops':>6} {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+    f"{'pk/op':>9} {'reads/op':>8} {'writes/op':>8}"
+)
+
+
+async def _measure(
+    name: str,
+    operations: list[Callable[[], Awaitable[Any]]],
+    concurrency: int,
+    fake: FakePluralKit,
+    service: Any,
+) -> _Result:
+    semaphore = Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def timed(operation: Callable[[], Awaitable[Any]]) -> None:
+        async with semaphore:
+            started = perf_counter()
+            await operation()
+            latencies.append(perf_counter() - started)
+
+    upstream = sum(fake.requests.values())
+    reads, writes = service.database.reads, service.database.writes
+    started = perf_counter()
+    await gather(*(timed(operation) for operation in operations))
+    return _Result(
+        name,
+        latencies,
+        perf_counter() - started,
+        sum(fake.requests.values()) - upstream,
+        service.database.reads - reads,
+        service.database.writes - writes,
+    )
+
+
+async def _benchmark(args: Namespace, directory: str) -> None:
+    fake = FakePluralKit(
+        members_per_system=args.members,
+        switches_per_system=args.switches,
+        latency=args.latency,
+        private_systems=range(1, args.systems + 1, 5),
+        rate_limit_every=args.rate_limit_every,
+    )
+    environ['PLURALKIT_API_URL'] = await fake.start()
+    redis: FakeRedis | None = None
+    if args.shared_cache:
+        redis = FakeRedis()
+        environ['CACHE_BACKEND_URL'] = await redis.start()
+    environ['DATABASE_NAME'] = f"{directory}/bench"
+    environ.setdefault('DISCORD_BOT_TOKEN', "bench")
+
+    # Configuration is read from the environment at import time, so the app is only imported once it's set.
+    from bot import bot
+    from cogs.check import CheckCommand
+    from cogs.stats import SystemStats
+    from cogs.whitelist import WhitelistCommand
+    from utils.ratelimit import RateLimiter
+    from utils.sqlite import check_sqlite_connection
+
+    bot.loop = get_running_loop()
+    check_sqlite_connection()
+    service = bot.service
+    await service.start()
+    if args.pk_rate is not None:
+        service.pluralkit.rate_limiter = RateLimiter(args.pk_rate, max(int(args.pk_rate), 1))
+
+    check = CheckCommand(bot)
+    stats = SystemStats(bot)
+    whitelist = WhitelistCommand(bot)
+    rng = Random(args.seed)
+    systems = list(range(1, args.systems + 1))
+    for system_id in systems[::5]:
+        await service.set_pluralkit_token(system_id, f"token-{system_id}")
+    for system_id in systems[::3]:
+        await service.set_whitelist_enabled(system_id, True)
+        await service.add_users_to_whitelist(system_id, range(10_000, 10_000 + args.whitelist_size))
+
+    def check_operation(system_id: int, viewer_id: int, timestamp: float) -> Callable[[], Awaitable[Any]]:
+        moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+        return lambda: check._handle_check_command(_Interaction(viewer_id), moment, system_id)  # type: ignore[arg-type]
+
+    def random_checks() -> list[Callable[[], Awaitable[Any]]]:
+        return [
+            check_operation(
+                rng.choice(systems),
+                rng.choice((rng.randrange(10_000, 10_000 + max(args.whitelist_size, 1)), 999_999)),
+                rng.uniform(fake.history_start, fake.history_start + args.switches * fake.switch_interval),
+            ) for _ in range(args.operations)
+        ]
+
+    def stats_operation(system_id: int) -> Callable[[], Awaitable[Any]]:
+        return lambda: stats.config_whitelist_add.callback(stats, _Interaction(system_id))  # type: ignore[arg-type]
+
+    def whitelist_operation(owner_id: int, user_id: int, add: bool) -> Callable[[], Awaitable[Any]]:
+        command = whitelist.config_whitelist_add if add else whitelist.config_whitelist_remove
+        return lambda: command.callback(whitelist, _Interaction(owner_id), _User(user_id))  # type: ignore[arg-type]
+
+    results: list[_Result] = []
+    try:
+        results.append(await _measure("check (cold)", random_checks(), args.concurrency, fake, service))
+        results.append(await _measure("check (warm)", random_checks(), args.concurrency, fake, service))
+        service.member_cache.clear()
+        service.stats_cache.clear()
+        stats_runs = [stats_operation(rng.choice(systems)) for _ in range(args.operations)]
+        results.append(await _measure("system-stats", stats_runs, args.concurrency, fake, service))
+        pairs = [(rng.choice(systems), 50_000 + index) for index in range(args.operations)]
+        added = [whitelist_operation(owner_id, user_id, True) for owner_id, user_id in pairs]
+        results.append(await _measure("whitelist add", added, args.concurrency, fake, service))
+        removed = [whitelist_operation(owner_id, user_id, False) for owner_id, user_id in pairs]
+        results.append(await _measure("whitelist remove", removed, args.concurrency, fake, service))
+    finally:
+        await service.close()
+        await fake.close()
+        if redis is not None:
+            await redis.close()
+
+    print(_HEADER)
+    for result in results:
+        print(result.row())
+    print(f"upstream requests by route: {fake.requests}, 429s injected: {fake.rate_limited}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the bot's commands against a fake PluralKit API.")
+    parser.add_argument('--systems', type=int, default=50)
+    parser.add_argument('--members', type=int, default=200, help="members in every system")
+    parser.add_argument('--switches', type=int, default=1000, help="switches in every system")
+    parser.add_argument('--whitelist-size', type=int, default=500, help="entries on every whitelisted system")
+    parser.add_argument('--operations', type=int, default=500, help="commands run per scenario")
+    parser.add_argument('--concurrency', type=int, default=25)
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds the fake API adds to every response")
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="answer every Nth upstream request with a 429")
+    parser.add_argument('--pk-rate', type=float, default=None, help="override the PluralKit rate limit (requests/second)")
+    parser.add_argument('--shared-cache', action='store_true', help="run with the shared cache backend against a fake Redis")
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+    with TemporaryDirectory() as temporary_directory:
+        run(_benchmark(arguments, temporary_directory))
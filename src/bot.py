@@ -1,22 +1,50 @@
-from discord import Intents
+from io import BytesIO
+from time import perf_counter
+
+from discord import File, Intents, Interaction
+from discord.app_commands import AppCommandError, Command, CommandTree, ContextMenu
 from discord.ext.commands import AutoShardedBot, Context, dm_only, when_mentioned
 
 from utils.env import DISCORD_BOT_TOKEN, YOUR_DISCORD_USER_ID
+from utils.metrics import metrics
 from utils.service import Service
 from utils.sqlite import check_sqlite_connection
 
 
+class MetricsCommandTree(CommandTree):
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        interaction.extras['started'] = perf_counter()
+        return True
+
+    async def on_error(self, interaction: Interaction, error: AppCommandError) -> None:
+        if interaction.command is not None:
+            observe_command(interaction, interaction.command.qualified_name, 'error')
+        await super().on_error(interaction, error)
+
+
+def observe_command(interaction: Interaction, name: str, outcome: str) -> None:
+    started = interaction.extras.get('started')
+    if started is not None:
+        metrics.observe('command_seconds', perf_counter() - started, command=name, outcome=outcome)
+
+
 class PluralKitDMUtilities(AutoShardedBot):
     def __init__(self, intents: Intents, *args, **kwargs):
-        super().__init__(intents=intents, command_prefix=when_mentioned, *args, **kwargs)
+        super().__init__(intents=intents, command_prefix=when_mentioned, tree_cls=MetricsCommandTree, *args, **kwargs)
         self.service = Service(self)
 
     async def setup_hook(self):
         check_sqlite_connection()
+        await self.service.start()
         await self.load_extension('cogs.check')
         await self.load_extension('cogs.config')
         await self.load_extension('cogs.whitelist')
         await self.load_extension('cogs.stats')
+        await self.load_extension('cogs.history')
+
+    async def close(self) -> None:
+        await self.service.close()
+        await super().close()
 
 
 intents = Intents.none()
@@ -29,6 +57,11 @@ async def on_ready():
     print(f'Logged in as {bot.user}')
 
 
+@bot.event
+async def on_app_command_completion(interaction: Interaction, command: Command | ContextMenu) -> None:
+    observe_command(interaction, command.qualified_name, 'ok')
+
+
 @bot.command(name="sync")
 @dm_only()
 async def sync_command(ctx: Context[PluralKitDMUtilities]) -> None:
@@ -37,5 +70,12 @@ async def sync_command(ctx: Context[PluralKitDMUtilities]) -> None:
         await ctx.reply("Synced!")
 
 
+@bot.command(name="metrics")
+@dm_only()
+async def metrics_command(ctx: Context[PluralKitDMUtilities]) -> None:
+    if ctx.author.id == YOUR_DISCORD_USER_ID:
+        await ctx.reply(file=File(BytesIO(metrics.summary().encode()), filename="metrics.txt"))
+
+
 if __name__ == "__main__":
     bot.run(DISCORD_BOT_TOKEN)
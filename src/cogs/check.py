@@ -1,21 +1,33 @@
+from asyncio import Task, create_task, gather
 from datetime import datetime, timedelta, timezone
-from typing import cast
+from typing import Any, cast
 
 from discord import Interaction, Message, User, app_commands
 from discord.ext.commands import Cog
 
 from bot import PluralKitDMUtilities
 from utils.constants import (
+    BULK_CHECK_MAX_MESSAGES,
+    FRONT_HISTORY_PAGE_SIZE,
+    NOT_WHITELISTED_MESSAGE,
     PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE,
-    PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND,
+    PLURALKIT_REQUEST_DEADLINE,
+    PLURALKIT_SYNC_DEADLINE,
+    PLURALKIT_UNAVAILABLE_MESSAGE,
+    STALE_DATA_NOTICE,
+    SYSTEM_NOT_FOUND_MESSAGE,
 )
-from utils.functions import snowflake_to_timestamp
+from utils.functions import front_error_message, paginate_lines, snowflake_to_timestamp
+from utils.pluralkit import PluralKitUnavailable
+from utils.staleness import track_staleness
 from utils.types import (
     PRIVATE_TO_EVERYONE_INCL_SYSTEM,
     PRIVATE_TO_EVERYONE_NOT_INCL_SYSTEM,
     PUBLIC_TO_EVERYONE,
     FrontMemberVisibility,
-    SwitchAPI,
+    Member,
+    Switch,
+    UserConfig,
 )
 
 
@@ -32,38 +44,89 @@ class CheckCommand(Cog):
         self.bot.tree.remove_command(self.ctx_menu.name, type=self.ctx_menu.type)
 
     async def _handle_check_command(self, interaction: Interaction[PluralKitDMUtilities], timestamp: datetime, author_id: int) -> None:
-        whitelist = await self.bot.service.get_user_whitelist(author_id)
-        whitelist.append(author_id)
-        user_information = await self.bot.service.get_user_config(author_id)
-        if (
-            interaction.user.id not in whitelist
-            and user_information is not None
-            and user_information['whitelist_enabled'] == True
-        ):
-            await interaction.edit_original_response(content="You have not been whitelisted to see this systems front history.")
+        try:
+            await self._check_front(interaction, timestamp, author_id)
+        except PluralKitUnavailable:
+            await interaction.edit_original_response(content=PLURALKIT_UNAVAILABLE_MESSAGE)
+
+    async def _check_front(self, interaction: Interaction[PluralKitDMUtilities], timestamp: datetime, author_id: int) -> None:
+        # One deadline for the whole check, so retries can't push the reply past what a user will wait for.
+        deadline = self.bot.loop.time() + PLURALKIT_REQUEST_DEADLINE
+        stale = track_staleness()
+        if self.bot.service.is_known_non_system(author_id):
+            await interaction.edit_original_response(content=SYSTEM_NOT_FOUND_MESSAGE)
             return
 
-        recent_switches = await self.bot.service.get_front_at_time(author_id, time=timestamp, skip_auth_headers=True)
-        if type(recent_switches) == int:
-            if recent_switches == PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE:
-                recent_switches = await self.bot.service.get_front_at_time(author_id, time=timestamp, skip_auth_headers=False)
-                if recent_switches == PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE:
-                    await interaction.edit_original_response(content="This system's PluralKit front history is private and has not provided a PluralKit token to this app (`/config pk-token set`).")
-                    return
-            elif recent_switches == PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND:
-                await interaction.edit_original_response(content="This account is not registered as a system with PluralKit.")
+        pending: list[Task[Any]] = []
+        try:
+            # Systems already known to have a private front history go straight to the authenticated
+            # request. Everyone else's switches are fetched while the config is still loading, but only
+            # when the viewer is already known to get past the whitelist: a fetch can't be taken back once
+            # started, so a denied check would still spend PluralKit requests on it.
+            skip_auth_headers = not self.bot.service.front_history_requires_auth(author_id)
+            context_task = create_task(self.bot.service.get_check_context(author_id, interaction.user.id))
+            pending.append(context_task)
+            front_task: Task[list[Switch] | int] | None = None
+            if skip_auth_headers and self.bot.service.is_known_whitelisted(author_id, interaction.user.id):
+                front_task = create_task(self.bot.service.get_front_at_time(
+                    author_id, time=timestamp, skip_auth_headers=True, deadline=deadline,
+                ))
+                pending.append(front_task)
+
+            user_information, whitelisted = await context_task
+            if (
+                not whitelisted
+                and user_information is not None
+                and user_information['whitelist_enabled'] == True
+            ):
+                await interaction.edit_original_response(content=NOT_WHITELISTED_MESSAGE)
+                return
+
+            headers = self.bot.service.pk_api_headers(user_information)
+            if front_task is None:
+                front_task = create_task(self.bot.service.get_front_at_time(
+                    author_id, time=timestamp, skip_auth_headers=skip_auth_headers, headers=headers, deadline=deadline,
+                ))
+                pending.append(front_task)
+            recent_switches = await front_task
+            if recent_switches == PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE and skip_auth_headers:
+                await self.bot.service.mark_front_history_private(author_id)
+                recent_switches = await self.bot.service.get_front_at_time(
+                    author_id, time=timestamp, skip_auth_headers=False, headers=headers, deadline=deadline,
+                )
+            if type(recent_switches) == int:
+                await interaction.edit_original_response(content=front_error_message(recent_switches))
                 return
-            else:
-                await interaction.edit_original_response(content="An unknown error has occurred.")
+
+            recent_switches = cast(list[Switch], recent_switches)
+            if len(recent_switches) == 0:
+                await interaction.edit_original_response(
+                    content=f"This message was sent before the first switch registered by this system.",
+                )
                 return
 
-        recent_switches = cast(list[SwitchAPI], recent_switches)
-        if len(recent_switches) == 0:
-            await interaction.edit_original_response(
-                content=f"This message was sent before the first switch registered by this system.",
+            members = await self.bot.service.get_front_members(
+                author_id, recent_switches[0], headers=headers, deadline=deadline,
             )
-            return
+        finally:
+            # Anything still running is no longer needed here. A PluralKit request shared through the single
+            # flight carries on regardless, for whoever else is waiting on it and to fill the cache.
+            for task in pending:
+                task.cancel()
+            await gather(*pending, return_exceptions=True)
+
+        use_display_name, show_private_members = self._display_settings(user_information, author_id, interaction.user.id)
+        front_ids = recent_switches[0].members
+        fronters_formatted = self._format_fronters(front_ids, members, use_display_name, show_private_members)
 
+        content = "There is no one currently fronting / registered as switched in for this system."
+        if len(front_ids) > 0:
+            content = f"Fronters: {', '.join(fronters_formatted)}"
+        if stale:
+            content += f"\n{STALE_DATA_NOTICE}"
+        await interaction.edit_original_response(content=content)
+
+    def _display_settings(self, user_information: UserConfig | None, author_id: int, viewer_id: int) -> tuple[bool, bool]:
         use_display_name = True
         if user_information is not None:
             use_display_name = user_information['prefer_display_names']
@@ -74,32 +137,116 @@ class CheckCommand(Cog):
 
         show_private_members = (
             False if front_member_visibility == PRIVATE_TO_EVERYONE_INCL_SYSTEM
-            else True if front_member_visibility == PRIVATE_TO_EVERYONE_NOT_INCL_SYSTEM and author_id == interaction.user.id
+            else True if front_member_visibility == PRIVATE_TO_EVERYONE_NOT_INCL_SYSTEM and author_id == viewer_id
             else True if front_member_visibility == PUBLIC_TO_EVERYONE
             else False  # base case that should never be called lol
         )
+        return use_display_name, show_private_members
 
-        front_ids = recent_switches[0]['members']
+    def _format_fronters(
+        self,
+        front_ids: tuple[str, ...],
+        members: dict[str, Member],
+        use_display_name: bool,
+        show_private_members: bool,
+    ) -> list[str]:
         fronters_formatted: list[str] = []
-        members = await self.bot.service.get_system_member_information(author_id)
         for member_id in front_ids:
             member = members.get(member_id, None)
             if member is None:
                 continue
-            member_is_private = not (member.get('privacy', {}) or {}).get('visibility', 'public') == 'public'
-            if not member_is_private or member_is_private and show_private_members:
+            if not member.private or member.private and show_private_members:
                 fronters_formatted.append(
                     f"[{self.bot.service.format_member_name(member, use_display_name)}](https://pluralkit.xyz/m/{member_id})"
                 )
+        return fronters_formatted
 
-        if len(front_ids) > 0:
-            await interaction.edit_original_response(
-                content=f"Fronters: {', '.join(fronters_formatted)}",
+    async def _check_fronts(
+        self,
+        interaction: Interaction[PluralKitDMUtilities],
+        author_id: int,
+        message_urls: dict[int, str],
+        end_message_url: tuple[int, str] | None,
+        page: int,
+    ) -> None:
+        deadline = self.bot.loop.time() + PLURALKIT_SYNC_DEADLINE
+        stale = track_staleness()
+        if self.bot.service.is_known_non_system(author_id):
+            await interaction.edit_original_response(content=SYSTEM_NOT_FOUND_MESSAGE)
+            return
+
+        user_information, whitelisted = await self.bot.service.get_check_context(author_id, interaction.user.id)
+        if (
+            not whitelisted
+            and user_information is not None
+            and user_information['whitelist_enabled'] == True
+        ):
+            await interaction.edit_original_response(content=NOT_WHITELISTED_MESSAGE)
+            return
+
+        headers = self.bot.service.pk_api_headers(user_information)
+        timestamps = {message_id: snowflake_to_timestamp(message_id) for message_id in message_urls}
+
+        async def resolve(skip_auth_headers: bool) -> dict[float, list[Switch]] | list[Switch] | int:
+            if end_message_url is None:
+                return await self.bot.service.get_fronts_at_times(
+                    author_id, timestamps.values(), skip_auth_headers=skip_auth_headers, headers=headers, deadline=deadline,
+                )
+            return await self.bot.service.get_switches_between(
+                author_id,
+                next(iter(timestamps.values())),
+                snowflake_to_timestamp(end_message_url[0]),
+                skip_auth_headers=skip_auth_headers,
+                headers=headers,
+                deadline=deadline,
             )
+
+        skip_auth_headers = not self.bot.service.front_history_requires_auth(author_id)
+        fronts = await resolve(skip_auth_headers)
+        if fronts == PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE and skip_auth_headers:
+            await self.bot.service.mark_front_history_private(author_id)
+            fronts = await resolve(False)
+        if type(fronts) == int:
+            await interaction.edit_original_response(content=front_error_message(fronts))
             return
-        await interaction.edit_original_response(
-            content="There is no one currently fronting / registered as switched in for this system."
-        )
+
+        members = await self.bot.service.get_system_member_information(author_id, headers=headers, deadline=deadline)
+        use_display_name, show_private_members = self._display_settings(user_information, author_id, interaction.user.id)
+
+        def describe(switch: Switch | None) -> str:
+            if switch is None:
+                return "*Before the first switch*"
+            fronters = self._format_fronters(switch.members, members, use_display_name, show_private_members)
+            if len(switch.members) == 0:
+                return "*No one fronting*"
+            return ', '.join(fronters)
+
+        lines: list[str] = []
+        if isinstance(fronts, dict):
+            for message_id, message_url in sorted(message_urls.items()):
+                sent_at = int(timestamps[message_id].timestamp())
+                front = fronts[float(sent_at)]
+                lines.append(f"[<t:{sent_at}:f>]({message_url}) {describe(front[0] if front else None)}")
+        else:
+            (start_id, start_url), = message_urls.items()
+            end_id, end_url = cast(tuple[int, str], end_message_url)
+            start = int(timestamps[start_id].timestamp())
+            active = fronts[0] if fronts and fronts[0].timestamp < start else None
+            lines.append(f"[<t:{start}:f>]({start_url}) {describe(active)}")
+            for switch in fronts:
+                if switch.timestamp >= start:
+                    lines.append(f"<t:{int(switch.timestamp)}:f> {describe(switch)}")
+            lines.append(f"[<t:{int(snowflake_to_timestamp(end_id).timestamp())}:f>]({end_url}) *End of range*")
+
+        pages = paginate_lines(lines, FRONT_HISTORY_PAGE_SIZE)
+        if page > len(pages):
+            await interaction.edit_original_response(content=f"There are only {len(pages)} pages of results.")
+            return
+        content = '\n'.join(pages[page - 1])
+        content += f"\n-# **Page {page} of {len(pages)}**"
+        if stale:
+            content += f"\n{STALE_DATA_NOTICE}"
+        await interaction.edit_original_response(content=content)
 
     @app_commands.allowed_contexts(dms=True, private_channels=True, guilds=True)
     @app_commands.allowed_installs(users=True, guilds=True)
@@ -124,6 +271,59 @@ class CheckCommand(Cog):
             timestamp = datetime.now(tz=timezone.utc) - timedelta(seconds=1)  # 1 second offset to adjust for PK api
         await self._handle_check_command(interaction, timestamp, user_mention.id)
 
+    @app_commands.command(name="check-fronts", description="Check the fronts for several messages at once!")
+    @app_commands.describe(
+        message_urls="Message URLs separated by spaces or commas, or the start of a range when an end is given.",
+        end_message_url="Show every switch between the first message and this one.",
+    )
+    @app_commands.allowed_contexts(dms=True, private_channels=True, guilds=True)
+    @app_commands.allowed_installs(users=True, guilds=True)
+    async def check_fronts_command(
+        self,
+        interaction: Interaction[PluralKitDMUtilities],
+        user_mention: User,
+        message_urls: str,
+        end_message_url: str | None = None,
+        page: int = 1,
+        ephemeral: bool = True,
+    ) -> None:
+        if page < 1:
+            return await interaction.response.send_message(
+                content="Page must be at least 1.",
+                ephemeral=True,
+            )
+
+        urls = message_urls.replace(",", " ").split()
+        try:
+            parsed_urls = {int(url.rstrip("/").split("/")[-1]): url for url in urls}
+            parsed_end = None
+            if end_message_url is not None:
+                parsed_end = (int(end_message_url.rstrip("/").split("/")[-1]), end_message_url)
+        except ValueError:
+            return await interaction.response.send_message(
+                content="One of those doesn't look like a message URL.",
+                ephemeral=True,
+            )
+
+        if len(parsed_urls) == 0:
+            return await interaction.response.send_message(content="Give at least one message URL.", ephemeral=True)
+        if len(parsed_urls) > BULK_CHECK_MAX_MESSAGES:
+            return await interaction.response.send_message(
+                content=f"You can check at most {BULK_CHECK_MAX_MESSAGES} messages at once.",
+                ephemeral=True,
+            )
+        if parsed_end is not None and (len(parsed_urls) != 1 or parsed_end[0] <= next(iter(parsed_urls))):
+            return await interaction.response.send_message(
+                content="A range needs exactly one start message URL, sent before the end message.",
+                ephemeral=True,
+            )
+
+        await interaction.response.defer(ephemeral=ephemeral)
+        try:
+            await self._check_fronts(interaction, user_mention.id, parsed_urls, parsed_end, page)
+        except PluralKitUnavailable:
+            await interaction.edit_original_response(content=PLURALKIT_UNAVAILABLE_MESSAGE)
+
 
 async def setup(bot: PluralKitDMUtilities) -> None:
     await bot.add_cog(CheckCommand(bot))
@@ -0,0 +1,154 @@
+from time import time
+
+from discord import Interaction, app_commands
+from discord.ext.commands import Cog
+
+from bot import PluralKitDMUtilities
+from utils.constants import (
+    FRONT_HISTORY_PAGE_SIZE,
+    PLURALKIT_SYNC_DEADLINE,
+    PLURALKIT_UNAVAILABLE_MESSAGE,
+    STALE_DATA_NOTICE,
+    SYSTEM_STATS_PAGE_SIZE,
+)
+from utils.functions import format_duration, front_error_message, paginate_lines
+from utils.pluralkit import PluralKitUnavailable
+from utils.staleness import track_staleness
+from utils.types import Member, Switch
+
+
+class FrontHistory(Cog):
+    def __init__(self, bot: PluralKitDMUtilities) -> None:
+        self.bot = bot
+
+    async def _use_display_name(self, user_id: int) -> bool:
+        user_information = await self.bot.service.get_user_config(user_id)
+        if user_information is not None:
+            return user_information['prefer_display_names']
+        return True
+
+    def _format_member(self, member_id: str, members: dict[str, Member], use_display_name: bool) -> str:
+        member = members.get(member_id, None)
+        if member is None:
+            return f"`{member_id}`"
+        return f"[{self.bot.service.format_member_name(member, use_display_name)}](https://pluralkit.xyz/m/{member_id})"
+
+    def _format_switch(self, switch: Switch, members: dict[str, Member], use_display_name: bool) -> str:
+        fronters = ', '.join(self._format_member(mid, members, use_display_name) for mid in switch.members)
+        return f"<t:{int(switch.timestamp)}:f> {fronters or '*No one fronting*'}"
+
+    @app_commands.command(
+        name="front-history",
+        description="See a timeline of your system's switches",
+    )
+    @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+    @app_commands.allowed_installs(guilds=True, users=True)
+    async def front_history(self, interaction: Interaction[PluralKitDMUtilities], ephemeral: bool = True, page: int = 1) -> None:
+        if page < 1:
+            return await interaction.response.send_message(
+                content="Page must be at least 1.",
+                ephemeral=True,
+            )
+
+        await interaction.response.defer(ephemeral=ephemeral)
+        deadline = self.bot.loop.time() + PLURALKIT_SYNC_DEADLINE
+        stale = track_staleness()
+        use_display_name = await self._use_display_name(interaction.user.id)
+        # Pages are cut by length, so how many switches one needs isn't known up front. More are synced until
+        # the page is followed by another one or the history runs out.
+        switch_count = page * FRONT_HISTORY_PAGE_SIZE
+        try:
+            while True:
+                index = await self.bot.service.sync_switch_history(
+                    interaction.user.id,
+                    switch_count=switch_count,
+                    deadline=deadline,
+                )
+                if type(index) == int:
+                    return await interaction.edit_original_response(content=front_error_message(index, own_system=True))
+                members = await self.bot.service.get_system_member_information(interaction.user.id, deadline=deadline)
+                switches = index.newest(0, switch_count)
+                lines = [self._format_switch(switch, members, use_display_name) for switch in switches]
+                pages = paginate_lines(lines, FRONT_HISTORY_PAGE_SIZE)
+                if len(pages) > page or len(switches) < switch_count:
+                    break
+                switch_count += FRONT_HISTORY_PAGE_SIZE
+        except PluralKitUnavailable:
+            return await interaction.edit_original_response(
+                content=PLURALKIT_UNAVAILABLE_MESSAGE,
+            )
+
+        if len(pages) == 0:
+            return await interaction.edit_original_response(content="Your system hasn't registered any switches yet.")
+        if page > len(pages):
+            return await interaction.edit_original_response(content="You don't have that many pages of switches.")
+
+        content = '\n'.join(pages[page - 1])
+        content += f"\n-# **Page {page}**"
+        if stale:
+            content += f"\n{STALE_DATA_NOTICE}"
+        await interaction.edit_original_response(content=content)
+
+    @app_commands.command(
+        name="front-time",
+        description="See how long each of your members has fronted",
+    )
+    @app_commands.describe(days="How many days back to count front time for.")
+    @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+    @app_commands.allowed_installs(guilds=True, users=True)
+    async def front_time(self, interaction: Interaction[PluralKitDMUtilities], ephemeral: bool = True, days: int = 30, page: int = 1) -> None:
+        if page < 1:
+            return await interaction.response.send_message(
+                content="Page must be at least 1.",
+                ephemeral=True,
+            )
+
+        if days < 1:
+            return await interaction.response.send_message(
+                content="Days must be at least 1.",
+                ephemeral=True,
+            )
+
+        await interaction.response.defer(ephemeral=ephemeral)
+        deadline = self.bot.loop.time() + PLURALKIT_SYNC_DEADLINE
+        stale = track_staleness()
+        now = time()
+        since = now - days * 86400
+        try:
+            index = await self.bot.service.sync_switch_history(interaction.user.id, since=since, deadline=deadline)
+            if type(index) == int:
+                return await interaction.edit_original_response(content=front_error_message(index, own_system=True))
+            members = await self.bot.service.get_system_member_information(interaction.user.id, deadline=deadline)
+        except PluralKitUnavailable:
+            return await interaction.edit_original_response(
+                content=PLURALKIT_UNAVAILABLE_MESSAGE,
+            )
+
+        totals = index.time_fronted(since, now)
+        if len(totals) == 0:
+            return await interaction.edit_original_response(content="No one has fronted in that time.")
+
+        use_display_name = await self._use_display_name(interaction.user.id)
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        window = now - since
+        lines = [
+            f"`{format_duration(seconds).rjust(11)}` `{str(round(seconds / window * 100, 2)).rjust(6)}%` "
+            f"{self._format_member(member_id, members, use_display_name)}"
+            for member_id, seconds in ranked
+        ]
+        pages = paginate_lines(lines, SYSTEM_STATS_PAGE_SIZE)
+        if page > len(pages):
+            return await interaction.edit_original_response(
+                content=f"You don't have that many pages, you only have {len(pages)} pages.",
+            )
+
+        content = '\n'.join(pages[page - 1])
+        content += f"\n\n**Front time since <t:{int(since)}:D>**"
+        content += f"\n-# **Page {page} / {len(pages)}**"
+        if stale:
+            content += f"\n{STALE_DATA_NOTICE}"
+        await interaction.edit_original_response(content=content)
+
+
+async def setup(bot: PluralKitDMUtilities) -> None:
+    await bot.add_cog(FrontHistory(bot))
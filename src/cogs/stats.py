@@ -1,8 +1,13 @@
+from time import time
+
 from discord import Interaction, app_commands
 from discord.ext.commands import Cog
 
 from bot import PluralKitDMUtilities
-from utils.functions import chunk_list
+from utils.constants import PLURALKIT_UNAVAILABLE_MESSAGE, STALE_DATA_NOTICE
+from utils.functions import front_error_message
+from utils.pluralkit import PluralKitUnavailable
+from utils.staleness import track_staleness
 
 
 class SystemStats(Cog):
@@ -15,42 +20,71 @@ class SystemStats(Cog):
     )
     @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
     @app_commands.allowed_installs(guilds=True, users=True)
-    async def config_whitelist_add(self, interaction: Interaction[PluralKitDMUtilities], ephemeral: bool = True, page: int = 1) -> None:
+    @app_commands.describe(days="Only count messages sent in the last this many days.")
+    async def config_whitelist_add(
+        self,
+        interaction: Interaction[PluralKitDMUtilities],
+        ephemeral: bool = True,
+        page: int = 1,
+        days: int | None = None,
+    ) -> None:
         if page < 1:
             return await interaction.response.send_message(
                 content="Page must be at least 1.",
                 ephemeral=True,
             )
 
+        if days is not None and days < 1:
+            return await interaction.response.send_message(
+                content="Days must be at least 1.",
+                ephemeral=True,
+            )
+
         await interaction.response.defer(ephemeral=ephemeral)
-        members = await self.bot.service.get_system_member_information(interaction.user.id)
+        stale = track_staleness()
+        since: float | None = None
+        try:
+            if days is None:
+                stats = await self.bot.service.get_system_stats(interaction.user.id)
+            else:
+                windowed = await self.bot.service.get_system_stats_since(interaction.user.id, time() - days * 86400)
+                if windowed is None:
+                    return await interaction.edit_original_response(
+                        content="There is no message history for your system from that far back yet, try fewer days or check back later.",
+                    )
+                if type(windowed) == int:
+                    stats = windowed
+                else:
+                    stats, since = windowed
+        except PluralKitUnavailable:
+            return await interaction.edit_original_response(
+                content=PLURALKIT_UNAVAILABLE_MESSAGE,
+            )
+        if type(stats) == int:
+            return await interaction.edit_original_response(
+                content=front_error_message(stats, own_system=True),
+            )
         user_information = await self.bot.service.get_user_config(interaction.user.id)
         use_display_name = True
         if user_information is not None:
             use_display_name = user_information['prefer_display_names']
 
-        message_counts: list[int] = [mem['message_count'] or 0 for _, mem in members.items()]
-        total_messages = sum(message_counts)
-        max_messages_width: int = max([len(str(msg_count)) for msg_count in message_counts])
-        content: dict[int, str] = {
-            (mem['message_count'] or 0): (
-                f"`[{mid}]` `{str(mem['message_count'] or 0).rjust(max_messages_width)} messages` "
-                f"`{str(round(((mem['message_count'] or 0) / total_messages) * 100, 2)).rjust(5)}%` "
-                f"{self.bot.service.format_member_name(mem, use_display_name)}"
-            ) for mid, mem in members.items()
-        }
-        sorted_content = dict(sorted(content.items(), reverse=True))
-        pages = chunk_list([v for _, v in sorted_content.items()], 30)
-
-        if page > len(pages):
-            return await interaction.response.send_message(
-                content=f"You don't have that many pages, you only have {len(pages)} pages.",
-                ephemeral=True,
+        if stats.page_count == 0:
+            return await interaction.edit_original_response(content="Your system doesn't have any members yet.")
+
+        if page > stats.page_count:
+            return await interaction.edit_original_response(
+                content=f"You don't have that many pages, you only have {stats.page_count} pages.",
             )
 
-        sorted_content_as_string = '\n'.join(pages[page - 1])
-        sorted_content_as_string += f"\n\n**Total message count: `{total_messages}`**"
-        sorted_content_as_string += f"\n-# **Page {page} / {len(pages)}**"
+        sorted_content_as_string = stats.render_page(page, use_display_name, self.bot.service.format_member_name)
+        if since is None:
+            sorted_content_as_string += f"\n\n**Total message count: `{stats.total_messages}`**"
+        else:
+            sorted_content_as_string += f"\n\n**Message count since <t:{int(since)}:D>: `{stats.total_messages}`**"
+        sorted_content_as_string += f"\n-# **Page {page} / {stats.page_count}**"
+        if stale:
+            sorted_content_as_string += f"\n{STALE_DATA_NOTICE}"
         await interaction.edit_original_response(content=sorted_content_as_string)
 
 
@@ -1,9 +1,12 @@
-from discord import Interaction, User
+from io import BytesIO
+
+from discord import Attachment, File, Interaction, User
 from discord.app_commands import AppCommandContext, AppInstallationType, Group
 from discord.ext.commands import Cog
 
 from bot import PluralKitDMUtilities
-from utils.functions import chunk_list
+from utils.constants import WHITELIST_BULK_MAX_USERS, WHITELIST_IMPORT_MAX_BYTES
+from utils.functions import chunk_list, parse_user_ids
 
 
 class WhitelistCommand(Cog):
@@ -28,8 +31,7 @@ class WhitelistCommand(Cog):
                 ephemeral=True,
             )
 
-        whitelist = await self.bot.service.get_user_whitelist(interaction.user.id)
-        if user.id in whitelist:
+        if await self.bot.service.is_user_whitelisted(interaction.user.id, user.id):
             return await interaction.response.send_message(
                 content=f"{user.mention} is already on your whitelist!",
                 ephemeral=True,
@@ -52,8 +54,7 @@ class WhitelistCommand(Cog):
                 ephemeral=True,
             )
 
-        whitelist = await self.bot.service.get_user_whitelist(interaction.user.id)
-        if user.id not in whitelist:
+        if not await self.bot.service.is_user_whitelisted(interaction.user.id, user.id):
             return await interaction.response.send_message(
                 content=f"{user.mention} is not on your whitelist!",
                 ephemeral=True,
@@ -77,7 +78,7 @@ class WhitelistCommand(Cog):
             )
 
         whitelist = await self.bot.service.get_user_whitelist(interaction.user.id)
-        whitelist_formatted = [f'`{uid}` - <@{uid}>' for uid in whitelist]
+        whitelist_formatted = [f'`{uid}` - <@{uid}>' for uid in sorted(whitelist)]
         whitelist_chunked = chunk_list(whitelist_formatted, 50)
 
         if page > len(whitelist_chunked):
@@ -91,6 +92,73 @@ class WhitelistCommand(Cog):
         formatted += f"\n\n-# **Page {page} / {len(whitelist_chunked)}**"
         return await interaction.response.send_message(content=formatted, ephemeral=True)
 
+    async def _bulk_update(self, interaction: Interaction[PluralKitDMUtilities], user_ids: list[int], *, add: bool) -> None:
+        if len(user_ids) == 0:
+            return await interaction.edit_original_response(content="Couldn't find any user IDs or mentions in that.")
+        if len(user_ids) > WHITELIST_BULK_MAX_USERS:
+            return await interaction.edit_original_response(
+                content=f"You can only change {WHITELIST_BULK_MAX_USERS} users at once.",
+            )
+
+        if add:
+            changed = await self.bot.service.add_users_to_whitelist(interaction.user.id, user_ids)
+            content = f"Added {len(changed)} users to your whitelist."
+        else:
+            changed = await self.bot.service.remove_users_from_whitelist(interaction.user.id, user_ids)
+            content = f"Removed {len(changed)} users from your whitelist."
+        if len(changed) < len(user_ids):
+            content += f"\n-# {len(user_ids) - len(changed)} were skipped as they were {'already' if add else 'not'} on it."
+        await interaction.edit_original_response(content=content)
+
+    @whitelist.command(
+        name="add-many",
+        description="Allow several people to check your front, by pasting their IDs or mentions.",
+    )
+    async def config_whitelist_add_many(self, interaction: Interaction[PluralKitDMUtilities], users: str) -> None:
+        await interaction.response.defer(ephemeral=True)
+        await self._bulk_update(interaction, parse_user_ids(users), add=True)
+
+    @whitelist.command(
+        name="remove-many",
+        description="Revoke several people's access to check your front, by pasting their IDs or mentions.",
+    )
+    async def config_whitelist_remove_many(self, interaction: Interaction[PluralKitDMUtilities], users: str) -> None:
+        await interaction.response.defer(ephemeral=True)
+        await self._bulk_update(interaction, parse_user_ids(users), add=False)
+
+    @whitelist.command(
+        name="import",
+        description="Add everyone listed in a text file (e.g. from /whitelist export) to your whitelist.",
+    )
+    async def config_whitelist_import(self, interaction: Interaction[PluralKitDMUtilities], file: Attachment) -> None:
+        if file.size > WHITELIST_IMPORT_MAX_BYTES:
+            return await interaction.response.send_message(
+                content="That file is too large to import.",
+                ephemeral=True,
+            )
+
+        await interaction.response.defer(ephemeral=True)
+        content = await file.read()
+        await self._bulk_update(interaction, parse_user_ids(content.decode(errors="ignore")), add=True)
+
+    @whitelist.command(
+        name="export",
+        description="Download your whitelist as a text file.",
+    )
+    async def config_whitelist_export(self, interaction: Interaction[PluralKitDMUtilities]) -> None:
+        await interaction.response.defer(ephemeral=True)
+        buffer = BytesIO()
+        async for user_id in self.bot.service.iterate_user_whitelist(interaction.user.id):
+            buffer.write(f"{user_id}\n".encode())
+        if buffer.tell() == 0:
+            return await interaction.edit_original_response(content="Your whitelist is empty.")
+
+        buffer.seek(0)
+        await interaction.edit_original_response(
+            content="Here is your whitelist, you can load it again with `/whitelist import`.",
+            attachments=[File(buffer, filename="whitelist.txt")],
+        )
+
     @whitelist.command(
         name="enable",
         description="Enable your whitelist.",
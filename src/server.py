@@ -0,0 +1,63 @@
+from asyncio import Event, run
+from multiprocessing import Process
+from sys import argv, exit as sys_exit
+
+from bot import bot
+from utils.env import (
+    CACHE_BACKEND_URL,
+    CACHE_SNAPSHOT_PATH,
+    DISCORD_BOT_TOKEN,
+    DISCORD_PUBLIC_KEY,
+    INTERACTIONS_HOST,
+    INTERACTIONS_PORT,
+    INTERACTIONS_WORKERS,
+)
+from utils.interactions import InteractionServer
+
+
+async def serve() -> None:
+    assert DISCORD_PUBLIC_KEY is not None, "DISCORD_PUBLIC_KEY is required to serve interactions over HTTP."
+    server = InteractionServer(bot, DISCORD_PUBLIC_KEY)
+    async with bot:
+        # A REST-only login runs setup_hook (database, PluralKit client and cogs) without opening a gateway.
+        await bot.login(DISCORD_BOT_TOKEN)
+        await server.start(INTERACTIONS_HOST, INTERACTIONS_PORT, reuse_port=INTERACTIONS_WORKERS > 1)
+        print(f'Serving interactions for {bot.user} on {INTERACTIONS_HOST}:{INTERACTIONS_PORT}')
+        try:
+            await Event().wait()
+        finally:
+            await server.close()
+
+
+async def sync() -> None:
+    async with bot:
+        await bot.login(DISCORD_BOT_TOKEN)
+        await bot.tree.sync()
+        print("Synced!")
+
+
+def worker(index: int | None = None) -> None:
+    if index is not None:
+        # Every worker keeps its own cache snapshot, so they never write over each other's.
+        bot.service.snapshot_path = f"{CACHE_SNAPSHOT_PATH}.{index}"
+    try:
+        run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    if argv[1:] == ["sync"]:
+        run(sync())
+    elif INTERACTIONS_WORKERS <= 1:
+        worker()
+    elif CACHE_BACKEND_URL is None or CACHE_BACKEND_URL.startswith('memory://'):
+        # Configs and whitelists are cached until changed, and only a shared backend tells the other
+        # workers about a change, so without one a denied viewer could keep seeing a system's front.
+        sys_exit("INTERACTIONS_WORKERS above 1 needs CACHE_BACKEND_URL pointing at a shared (redis://) backend.")
+    else:
+        workers = [Process(target=worker, args=(index,)) for index in range(INTERACTIONS_WORKERS)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
@@ -0,0 +1,320 @@
+from abc import ABC, abstractmethod
+from asyncio import (
+    Future,
+    IncompleteReadError,
+    Lock,
+    StreamReader,
+    StreamWriter,
+    Task,
+    create_task,
+    get_running_loop,
+    open_connection,
+    sleep,
+    wait_for,
+)
+from collections import OrderedDict, deque
+from collections.abc import Awaitable, Callable
+from time import monotonic
+from typing import Any
+from urllib.parse import unquote, urlsplit
+
+from utils.constants import (
+    CACHE_BACKEND_MEMORY_MAX_ENTRIES,
+    CACHE_BACKEND_RECONNECT_DELAY,
+    CACHE_BACKEND_TIMEOUT,
+)
+from utils.metrics import metrics
+
+
+__all__: tuple[str, ...] = (
+    "CacheBackend",
+    "MemoryBackend",
+    "RedisBackend",
+    "RedisError",
+    "open_backend",
+)
+
+
+# Handlers get ``None`` when messages may have been missed, e.g. while the subscription was reconnecting.
+type MessageHandler = Callable[[bytes | None], Awaitable[None]]
+
+
+class CacheBackend(ABC):
+    # Best effort by design: a backend that can't be reached reads as a miss and drops writes, so the
+    # bot carries on with its per-process caches rather than failing commands.
+    __slots__: tuple[str, ...] = (
+        '_handlers',
+    )
+
+    def __init__(self) -> None:
+        self._handlers: dict[str, list[MessageHandler]] = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, *, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        ...
+
+    @abstractmethod
+    async def publish(self, channel: str, message: bytes) -> None:
+        ...
+
+    def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        # Subscriptions are made before ``start``, which is when the backend starts listening.
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def _deliver(self, channel: str, message: bytes | None) -> None:
+        for handler in self._handlers.get(channel, ()):
+            try:
+                await handler(message)
+            except Exception:
+                metrics.increment('cache_backend_errors_total', operation='deliver')
+
+
+class MemoryBackend(CacheBackend):
+    # Private to the service that opened it, so nothing is actually shared. It runs the shared cache code paths
+    # without a Redis server, e.g. in benchmarks.
+    __slots__: tuple[str, ...] = (
+        'max_entries',
+        '_entries',
+    )
+
+    def __init__(self, max_entries: int = CACHE_BACKEND_MEMORY_MAX_ENTRIES) -> None:
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if monotonic() >= entry[1]:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, *, ttl: float) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = (value, monotonic() + ttl)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self._deliver(channel, message)
+
+
+class RedisError(Exception):
+    pass
+
+
+def _encode_command(args: tuple[str | bytes | int | float, ...]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts += (b"$%d\r\n" % len(data), data, b"\r\n")
+    return b"".join(parts)
+
+
+async def _read_reply(reader: StreamReader) -> Any:
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("The Redis connection was closed.")
+    kind, value = line[:1], line[1:-2]
+    if kind == b"+":
+        return value
+    if kind == b"-":
+        return RedisError(value.decode())
+    if kind == b":":
+        return int(value)
+    if kind == b"$":
+        length = int(value)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(value)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply from Redis: {line!r}")
+
+
+class RedisBackend(CacheBackend):
+    # Speaks RESP over plain asyncio streams. Commands are pipelined on one connection, with replies
+    # matched to callers in order; pub/sub needs a connection of its own.
+    __slots__: tuple[str, ...] = (
+        'host',
+        'port',
+        'database',
+        'password',
+        '_writer',
+        '_pending',
+        '_receiver',
+        '_listener',
+        '_connect_lock',
+    )
+
+    def __init__(self, host: str, port: int = 6379, *, database: int = 0, password: str | None = None) -> None:
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.database = database
+        self.password = password
+        self._writer: StreamWriter | None = None
+        self._pending: deque[Future[Any]] = deque()
+        self._receiver: Task[None] | None = None
+        self._listener: Task[None] | None = None
+        self._connect_lock = Lock()
+
+    async def start(self) -> None:
+        try:
+            await wait_for(self._ensure_connected(), CACHE_BACKEND_TIMEOUT)
+        except (OSError, RedisError, TimeoutError):
+            # Not fatal: every command retries the connection, so the cache picks up once Redis is back.
+            metrics.increment('cache_backend_errors_total', operation='connect')
+        if self._handlers and self._listener is None:
+            self._listener = create_task(self._listen())
+
+    async def close(self) -> None:
+        for task in (self._listener, self._receiver):
+            if task is not None:
+                task.cancel()
+        self._listener = self._receiver = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _handshake(self) -> list[tuple[str | int, ...]]:
+        commands: list[tuple[str | int, ...]] = []
+        if self.password is not None:
+            commands.append(('AUTH', self.password))
+        if self.database:
+            commands.append(('SELECT', self.database))
+        return commands
+
+    async def _open(self) -> tuple[StreamReader, StreamWriter]:
+        reader, writer = await open_connection(self.host, self.port)
+        for command in self._handshake():
+            writer.write(_encode_command(command))
+            reply = await _read_reply(reader)
+            if isinstance(reply, RedisError):
+                writer.close()
+                raise reply
+        return reader, writer
+
+    async def _ensure_connected(self) -> StreamWriter:
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            reader, writer = await self._open()
+            self._writer = writer
+            self._pending = deque()
+            self._receiver = create_task(self._receive(reader, writer, self._pending))
+            return writer
+
+    async def _receive(self, reader: StreamReader, writer: StreamWriter, pending: deque[Future[Any]]) -> None:
+        try:
+            while True:
+                reply = await _read_reply(reader)
+                future = pending.popleft()
+                # Callers that gave up waiting leave a cancelled future behind, whose reply is dropped.
+                if future.done():
+                    continue
+                if isinstance(reply, RedisError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except (OSError, IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            while pending:
+                future = pending.popleft()
+                if not future.done():
+                    future.set_exception(ConnectionError("The Redis connection was lost."))
+
+    async def _command(self, *args: str | bytes | int | float) -> Any:
+        writer = await self._ensure_connected()
+        future: Future[Any] = get_running_loop().create_future()
+        self._pending.append(future)
+        writer.write(_encode_command(args))
+        return await future
+
+    async def _run(self, operation: str, *args: str | bytes | int | float) -> Any:
+        try:
+            return await wait_for(self._command(*args), CACHE_BACKEND_TIMEOUT)
+        except (OSError, RedisError, TimeoutError):
+            metrics.increment('cache_backend_errors_total', operation=operation)
+            return None
+
+    async def get(self, key: str) -> bytes | None:
+        return await self._run('get', 'GET', key)
+
+    async def set(self, key: str, value: bytes, *, ttl: float) -> None:
+        await self._run('set', 'SET', key, value, 'PX', max(int(ttl * 1000), 1))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._run('delete', 'DEL', *keys)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self._run('publish', 'PUBLISH', channel, message)
+
+    async def _listen(self) -> None:
+        subscribed_before = False
+        while True:
+            try:
+                reader, writer = await self._open()
+            except Exception:
+                metrics.increment('cache_backend_errors_total', operation='subscribe')
+                await sleep(CACHE_BACKEND_RECONNECT_DELAY)
+                continue
+
+            try:
+                writer.write(_encode_command(('SUBSCRIBE', *self._handlers)))
+                if subscribed_before:
+                    for channel in self._handlers:
+                        await self._deliver(channel, None)
+                subscribed_before = True
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        await self._deliver(reply[1].decode(), reply[2])
+            except Exception:
+                # Whatever went wrong (a dropped connection, an error reply, a garbled one), the only way back
+                # to hearing about invalidations is a fresh connection, and resubscribing flushes what was missed.
+                metrics.increment('cache_backend_errors_total', operation='subscribe')
+            finally:
+                writer.close()
+            await sleep(CACHE_BACKEND_RECONNECT_DELAY)
+
+
+def open_backend(url: str) -> CacheBackend:
+    parts = urlsplit(url)
+    if parts.scheme == 'memory':
+        return MemoryBackend()
+    if parts.scheme == 'redis':
+        return RedisBackend(
+            parts.hostname or 'localhost',
+            parts.port or 6379,
+            database=int(parts.path.lstrip('/') or 0),
+            password=None if parts.password is None else unquote(parts.password),
+        )
+    raise ValueError(f"Unsupported cache backend URL: {url}")
@@ -0,0 +1,163 @@
+from asyncio import Task, create_task
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from time import monotonic
+
+
+__all__: tuple[str, ...] = (
+    "CacheEntry",
+    "TTLCache",
+)
+
+
+class CacheEntry[V]:
+    __slots__: tuple[str, ...] = (
+        'value',
+        'weight',
+        'fresh_until',
+        'stale_until',
+    )
+
+    def __init__(self, value: V, weight: int, fresh_until: float, stale_until: float) -> None:
+        self.value = value
+        self.weight = weight
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+    @property
+    def fresh(self) -> bool:
+        return monotonic() < self.fresh_until
+
+    @property
+    def expired(self) -> bool:
+        return monotonic() >= self.stale_until
+
+
+class TTLCache[K: Hashable, V]:
+    __slots__: tuple[str, ...] = (
+        'ttl',
+        'stale_ttl',
+        'max_entries',
+        'max_weight',
+        'hits',
+        'stale_hits',
+        'misses',
+        'evictions',
+        '_entries',
+        '_weight',
+        '_revalidating',
+    )
+
+    def __init__(self, *, ttl: float, stale_ttl: float = 0, max_entries: int, max_weight: int | None = None) -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[K, CacheEntry[V]] = OrderedDict()
+        self._weight = 0
+        self._revalidating: dict[K, Task[None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key, record=False) is not None
+
+    @property
+    def weight(self) -> int:
+        return self._weight
+
+    def get(self, key: K, *, record: bool = True, expired: bool = False) -> CacheEntry[V] | None:
+        # ``expired`` hands back entries past even their stale window, for when there's nothing better to serve.
+        entry = self._entries.get(key)
+        now = monotonic()
+        if entry is not None and now >= entry.stale_until and not expired:
+            self._remove(key)
+            entry = None
+
+        if entry is None:
+            if record:
+                self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        if record:
+            if now < entry.fresh_until:
+                self.hits += 1
+            elif now < entry.stale_until:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def entries(self) -> list[tuple[K, CacheEntry[V]]]:
+        # A copy, oldest first, so callers can yield to the event loop while going through it.
+        return list(self._entries.items())
+
+    def set(self, key: K, value: V, *, weight: int = 1) -> None:
+        now = monotonic()
+        self._insert(key, value, weight, now + self.ttl, now + self.ttl + self.stale_ttl)
+
+    def update(self, key: K, value: V, *, weight: int = 1) -> None:
+        # Swaps the value but keeps its expiry, so a value that keeps being added to (like a switch index gaining
+        # pages) is still thrown away once its TTL is up. An entry that's already gone is left that way.
+        entry = self.get(key, record=False)
+        if entry is not None:
+            self._insert(key, value, weight, entry.fresh_until, entry.stale_until)
+
+    def restore(self, key: K, value: V, *, weight: int = 1, fresh_for: float, stale_for: float) -> None:
+        # Loads an entry that was cached earlier, without replacing anything cached since.
+        if key in self._entries or stale_for <= 0:
+            return
+        now = monotonic()
+        self._insert(key, value, weight, now + fresh_for, now + stale_for)
+
+    def _insert(self, key: K, value: V, weight: int, fresh_until: float, stale_until: float) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if self.max_weight is not None and weight > self.max_weight:
+            return
+
+        self._entries[key] = CacheEntry(value, weight, fresh_until, stale_until)
+        self._weight += weight
+        while len(self._entries) > self.max_entries or (
+            self.max_weight is not None and self._weight > self.max_weight
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def invalidate_where(self, predicate: Callable[[K], bool]) -> None:
+        for key in [k for k in self._entries if predicate(k)]:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._weight = 0
+
+    def revalidate(self, key: K, loader: Callable[[], Awaitable[object]]) -> None:
+        if key in self._revalidating:
+            return
+
+        async def run() -> None:
+            try:
+                await loader()
+            finally:
+                self._revalidating.pop(key, None)
+
+        task = create_task(run())
+        # Background refreshes are best effort; the stale value has already been served.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._revalidating[key] = task
+
+    def _remove(self, key: K) -> None:
+        entry = self._entries.pop(key)
+        self._weight -= entry.weight
@@ -0,0 +1,189 @@
+from asyncio import CancelledError, create_task, shield, sleep, to_thread, wait
+from json import dumps, loads
+from mmap import ACCESS_READ, mmap
+from os import fdopen, replace, unlink
+from os.path import abspath, split
+from struct import Struct, error as StructError
+from tempfile import mkstemp
+from time import monotonic, perf_counter, time as unix_time
+from typing import Any, cast
+
+from utils.cache import TTLCache
+from utils.constants import CACHE_SNAPSHOT_BATCH_SIZE, CACHE_SNAPSHOT_MAX_AGE
+from utils.metrics import metrics
+from utils.serialization import pack_roster, pack_switch_index, unpack_roster, unpack_switch_index
+from utils.switches import SwitchIndex
+from utils.types import Member, UserConfig
+
+
+__all__: tuple[str, ...] = (
+    "save_cache_snapshot",
+    "read_cache_snapshot",
+    "restore_cache_snapshot",
+)
+
+
+# A header, then one record per cache entry: kind, user id, auth scope, when the entry stops being fresh
+# and when it expires (both wall clock, since monotonic time doesn't survive a restart), then the value.
+_MAGIC: bytes = b"PKUCACHE"
+_VERSION: int = 1
+_HEADER = Struct('<8sBd?')
+_RECORD = Struct('<BqddHI')
+
+_ROSTER: int = 1
+_SWITCHES: int = 2
+_NON_SYSTEM: int = 3
+_CONFIG: int = 4
+
+
+type _Record = tuple[int, int, str, float, float, Any]
+
+
+def _pack_record(kind: int, user_id: int, auth_scope: str, fresh_until: float, stale_until: float, blob: bytes) -> bytes:
+    scope = auth_scope.encode()
+    return _RECORD.pack(kind, user_id, fresh_until, stale_until, len(scope), len(blob)) + scope + blob
+
+
+def _write(path: str, chunks: list[bytes]) -> int:
+    # Written to a file of its own next to the snapshot and swapped in, so neither a crash nor another writer
+    # can leave a torn file behind. mkstemp makes it readable by the bot's own user only, as configs carry
+    # PluralKit tokens.
+    directory, name = split(abspath(path))
+    descriptor, temporary_path = mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory)
+    try:
+        with fdopen(descriptor, 'wb') as file:
+            file.writelines(chunks)
+        replace(temporary_path, path)
+    except BaseException:
+        unlink(temporary_path)
+        raise
+    return sum(map(len, chunks))
+
+
+def _unpack_value(kind: int, blob: bytes) -> Any:
+    if kind == _ROSTER:
+        return unpack_roster(blob)
+    if kind == _SWITCHES:
+        return unpack_switch_index(blob)
+    if kind == _CONFIG:
+        return loads(blob)
+    return True
+
+
+def _read(path: str) -> list[_Record]:
+    try:
+        with open(path, 'rb') as file, mmap(file.fileno(), 0, access=ACCESS_READ) as data:
+            magic, version, written_at, clean = _HEADER.unpack_from(data, 0)
+            if magic != _MAGIC or version != _VERSION:
+                return []
+            # Configs are only trusted from a recent snapshot taken at shutdown. A periodic one may predate
+            # a change made just before a crash, like enabling a whitelist.
+            trust_configs = clean and unix_time() - written_at <= CACHE_SNAPSHOT_MAX_AGE
+            records: list[_Record] = []
+            offset = _HEADER.size
+            while offset < len(data):
+                kind, user_id, fresh_until, stale_until, scope_length, blob_length = _RECORD.unpack_from(data, offset)
+                offset += _RECORD.size
+                auth_scope = str(data[offset:offset + scope_length], 'utf-8')
+                offset += scope_length
+                blob = data[offset:offset + blob_length]
+                offset += blob_length
+                if kind == _CONFIG and not trust_configs:
+                    continue
+                records.append((kind, user_id, auth_scope, fresh_until, stale_until, _unpack_value(kind, blob)))
+            return records
+    except (OSError, ValueError, IndexError, StructError):
+        # A missing, empty or corrupt snapshot just means starting cold.
+        return []
+
+
+async def save_cache_snapshot(
+    path: str,
+    *,
+    rosters: TTLCache[tuple[int, str], dict[str, Member]],
+    switches: TTLCache[tuple[int, str], SwitchIndex],
+    non_systems: TTLCache[int, bool],
+    configs: TTLCache[int, UserConfig | None],
+    clean: bool = False,
+) -> int:
+    started = perf_counter()
+    wall_offset = unix_time() - monotonic()
+    now = monotonic()
+    chunks = [_HEADER.pack(_MAGIC, _VERSION, unix_time(), clean)]
+
+    # Values are packed here rather than in the writer thread, since the loop may still be changing them.
+    # Yielding between batches keeps large caches from stalling everything else.
+    packed = 0
+    for kind, cache, pack in (
+        (_CONFIG, configs, lambda config: dumps(config).encode()),
+        (_NON_SYSTEM, non_systems, lambda _: b""),
+        (_ROSTER, rosters, pack_roster),
+        (_SWITCHES, switches, pack_switch_index),
+    ):
+        for key, entry in cast(TTLCache[Any, Any], cache).entries():
+            if now >= entry.stale_until:
+                continue
+            user_id, auth_scope = key if isinstance(key, tuple) else (key, '')
+            chunks.append(_pack_record(
+                kind,
+                user_id,
+                auth_scope,
+                entry.fresh_until + wall_offset,
+                entry.stale_until + wall_offset,
+                pack(entry.value),
+            ))
+            packed += 1
+            if packed % CACHE_SNAPSHOT_BATCH_SIZE == 0:
+                await sleep(0)
+
+    write = create_task(to_thread(_write, path, chunks))
+    try:
+        size = await shield(write)
+    except CancelledError:
+        # The thread can't be stopped, so a cancelled save still waits for it, or the next save would race it.
+        await wait((write,))
+        raise
+    except OSError:
+        metrics.increment('cache_snapshot_errors_total', operation='save')
+        return 0
+    metrics.observe('cache_snapshot_seconds', perf_counter() - started, operation='save')
+    return size
+
+
+async def read_cache_snapshot(path: str) -> list[_Record]:
+    # Reading and decoding happen off the loop; only the inserts below run on it.
+    return await to_thread(_read, path)
+
+
+async def restore_cache_snapshot(
+    records: list[_Record],
+    *,
+    rosters: TTLCache[tuple[int, str], dict[str, Member]],
+    switches: TTLCache[tuple[int, str], SwitchIndex],
+    non_systems: TTLCache[int, bool],
+    configs: TTLCache[int, UserConfig | None] | None,
+) -> int:
+    started = perf_counter()
+    restored = 0
+    # Configs come first in the file and are restored without yielding, so no config can be changed
+    # between the caller deciding they're still current and them landing in the cache.
+    for position, (kind, user_id, auth_scope, fresh_until, stale_until, value) in enumerate(records, 1):
+        now = unix_time()
+        fresh_for = fresh_until - now
+        stale_for = stale_until - now
+        if stale_for > 0:
+            if kind == _CONFIG:
+                if configs is None:
+                    continue
+                configs.restore(user_id, value, fresh_for=fresh_for, stale_for=stale_for)
+            elif kind == _NON_SYSTEM:
+                non_systems.restore(user_id, value, fresh_for=fresh_for, stale_for=stale_for)
+            elif kind == _ROSTER:
+                rosters.restore((user_id, auth_scope), value, weight=max(len(value), 1), fresh_for=fresh_for, stale_for=stale_for)
+            elif kind == _SWITCHES:
+                switches.restore((user_id, auth_scope), value, weight=max(len(value), 1), fresh_for=fresh_for, stale_for=stale_for)
+            restored += 1
+        if kind != _CONFIG and position % CACHE_SNAPSHOT_BATCH_SIZE == 0:
+            await sleep(0)
+    metrics.observe('cache_snapshot_seconds', perf_counter() - started, operation='restore')
+    return restored
@@ -0,0 +1,89 @@
+from collections import deque
+from time import monotonic
+
+
+__all__: tuple[str, ...] = (
+    "CIRCUIT_CLOSED",
+    "CIRCUIT_HALF_OPEN",
+    "CIRCUIT_OPEN",
+    "CircuitBreaker",
+)
+
+
+CIRCUIT_CLOSED: int = 0
+CIRCUIT_HALF_OPEN: int = 1
+CIRCUIT_OPEN: int = 2
+
+
+class CircuitBreaker:
+    # Trips once too many of the most recent requests failed, then rejects everything until ``open_for``
+    # has passed. After that a single probe is let through: success closes the circuit, failure reopens it.
+    __slots__: tuple[str, ...] = (
+        'min_requests',
+        'failure_ratio',
+        'open_for',
+        'opened',
+        '_outcomes',
+        '_opened_at',
+        '_probing',
+    )
+
+    def __init__(self, *, window: int, min_requests: int, failure_ratio: float, open_for: float) -> None:
+        self.min_requests = min_requests
+        self.failure_ratio = failure_ratio
+        self.open_for = open_for
+        self.opened = 0
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> int:
+        if self._opened_at is None:
+            return CIRCUIT_CLOSED
+        if monotonic() - self._opened_at < self.open_for:
+            return CIRCUIT_OPEN
+        return CIRCUIT_HALF_OPEN
+
+    @property
+    def rejecting(self) -> bool:
+        state = self.state
+        return state == CIRCUIT_OPEN or (state == CIRCUIT_HALF_OPEN and self._probing)
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CIRCUIT_CLOSED:
+            return True
+        if state == CIRCUIT_OPEN or self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record(self, success: bool | None) -> None:
+        # ``None`` is a request that neither proved nor disproved anything, like a 429 or a cancellation.
+        if self._opened_at is not None:
+            if not self._probing:
+                return
+            self._probing = False
+            if success is None:
+                return
+            if success:
+                self._opened_at = None
+                self._outcomes.clear()
+            else:
+                self._trip()
+            return
+
+        if success is None:
+            return
+        self._outcomes.append(success)
+        if (
+            len(self._outcomes) >= self.min_requests
+            and self._outcomes.count(False) >= self.failure_ratio * len(self._outcomes)
+        ):
+            self._trip()
+
+    def _trip(self) -> None:
+        self._opened_at = monotonic()
+        self._outcomes.clear()
+        self.opened += 1
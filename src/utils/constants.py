@@ -1,8 +1,121 @@
 __all__: tuple[str, ...] = (
     "PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND",
     "PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE",
+    "PLURALKIT_API_BASE_URL",
+    "PLURALKIT_HTTP_POOL_SIZE",
+    "PLURALKIT_HTTP_DNS_CACHE_TTL",
+    "PLURALKIT_HTTP_KEEPALIVE_TIMEOUT",
+    "PLURALKIT_HTTP_CONNECT_TIMEOUT",
+    "PLURALKIT_HTTP_REQUEST_TIMEOUT",
+    "PLURALKIT_HTTP_USER_AGENT",
+    "PLURALKIT_SWITCH_PAGE_SIZE",
+    "PLURALKIT_RATE_LIMIT_PER_SECOND",
+    "PLURALKIT_RATE_LIMIT_BURST",
+    "PLURALKIT_RETRY_ATTEMPTS",
+    "PLURALKIT_RETRY_BASE_DELAY",
+    "PLURALKIT_REQUEST_DEADLINE",
+    "PLURALKIT_SYNC_DEADLINE",
+    "PLURALKIT_CIRCUIT_WINDOW",
+    "PLURALKIT_CIRCUIT_MIN_REQUESTS",
+    "PLURALKIT_CIRCUIT_FAILURE_RATIO",
+    "PLURALKIT_CIRCUIT_OPEN_FOR",
+    "DATABASE_CACHED_STATEMENTS",
+    "DATABASE_WRITE_BATCH_SIZE",
+    "DATABASE_BUSY_TIMEOUT",
+    "DATABASE_FETCH_BATCH_SIZE",
+    "SYSTEM_STATS_PAGE_SIZE",
+    "FRONT_HISTORY_PAGE_SIZE",
+    "BULK_CHECK_MAX_MESSAGES",
+    "DISCORD_MESSAGE_MAX_LENGTH",
+    "PAGE_FOOTER_RESERVED_LENGTH",
+    "WHITELIST_BULK_MAX_USERS",
+    "WHITELIST_IMPORT_MAX_BYTES",
+    "SNAPSHOT_INTERVAL",
+    "SNAPSHOT_DAILY_RETENTION",
+    "SNAPSHOT_WEEKLY_RETENTION",
+    "INTERACTIONS_ACK_TIMEOUT",
+    "INTERACTIONS_ACK_POLL_INTERVAL",
+    "INTERACTIONS_MAX_TIMESTAMP_SKEW",
+    "METRICS_LATENCY_BUCKETS",
+    "CACHE_BACKEND_KEY_PREFIX",
+    "CACHE_BACKEND_INVALIDATION_CHANNEL",
+    "CACHE_BACKEND_TIMEOUT",
+    "CACHE_BACKEND_RECONNECT_DELAY",
+    "CACHE_BACKEND_WRITE_DELAY",
+    "CACHE_BACKEND_MEMORY_MAX_ENTRIES",
+    "CACHE_SNAPSHOT_MAX_AGE",
+    "CACHE_SNAPSHOT_BATCH_SIZE",
+    "STALE_DATA_NOTICE",
+    "PLURALKIT_UNAVAILABLE_MESSAGE",
+    "NOT_WHITELISTED_MESSAGE",
+    "SYSTEM_NOT_FOUND_MESSAGE",
+    "OWN_SYSTEM_NOT_FOUND_MESSAGE",
+    "FRONT_HISTORY_PRIVATE_MESSAGE",
+    "OWN_FRONT_HISTORY_PRIVATE_MESSAGE",
+    "UNKNOWN_ERROR_MESSAGE",
 )
 
 
 PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND: int = 20001
 PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE: int = 30005
+
+PLURALKIT_API_BASE_URL: str = "https://api.pluralkit.me"
+PLURALKIT_HTTP_POOL_SIZE: int = 64
+PLURALKIT_HTTP_DNS_CACHE_TTL: int = 300  # seconds
+PLURALKIT_HTTP_KEEPALIVE_TIMEOUT: float = 60.0  # seconds
+PLURALKIT_HTTP_CONNECT_TIMEOUT: float = 3.0  # seconds
+PLURALKIT_HTTP_REQUEST_TIMEOUT: float = 10.0  # seconds
+PLURALKIT_HTTP_USER_AGENT: str = "PK Utilities App (https://github.com/ijsbol/pk-utility-app)"
+PLURALKIT_SWITCH_PAGE_SIZE: int = 100  # the most switches the API returns per request
+PLURALKIT_RATE_LIMIT_PER_SECOND: float = 10.0
+PLURALKIT_RATE_LIMIT_BURST: int = 10
+PLURALKIT_RETRY_ATTEMPTS: int = 3
+PLURALKIT_RETRY_BASE_DELAY: float = 0.25  # seconds, doubled on every retry
+PLURALKIT_REQUEST_DEADLINE: float = 10.0  # seconds, covering every retry of one request
+PLURALKIT_SYNC_DEADLINE: float = 120.0  # seconds, for commands that may walk a whole switch history
+PLURALKIT_CIRCUIT_WINDOW: int = 20  # most recent requests the failure ratio is taken over
+PLURALKIT_CIRCUIT_MIN_REQUESTS: int = 10
+PLURALKIT_CIRCUIT_FAILURE_RATIO: float = 0.5
+PLURALKIT_CIRCUIT_OPEN_FOR: float = 30.0  # seconds before a probe request is let through
+
+DATABASE_CACHED_STATEMENTS: int = 128
+DATABASE_WRITE_BATCH_SIZE: int = 256
+DATABASE_BUSY_TIMEOUT: int = 5000  # milliseconds
+DATABASE_FETCH_BATCH_SIZE: int = 512
+
+SYSTEM_STATS_PAGE_SIZE: int = 30
+FRONT_HISTORY_PAGE_SIZE: int = 20
+BULK_CHECK_MAX_MESSAGES: int = 100
+DISCORD_MESSAGE_MAX_LENGTH: int = 2000  # characters
+PAGE_FOOTER_RESERVED_LENGTH: int = 200  # characters kept free on every page for its footer and the stale data notice
+WHITELIST_BULK_MAX_USERS: int = 5000
+WHITELIST_IMPORT_MAX_BYTES: int = 1024 * 1024
+SNAPSHOT_INTERVAL: int = 86400  # seconds between two message count snapshots of a system
+SNAPSHOT_DAILY_RETENTION: int = 30 * 86400  # seconds to keep every snapshot for
+SNAPSHOT_WEEKLY_RETENTION: int = 365 * 86400  # seconds to keep one snapshot a week for
+
+INTERACTIONS_ACK_TIMEOUT: float = 2.5  # seconds, Discord drops interactions not acknowledged within 3
+INTERACTIONS_ACK_POLL_INTERVAL: float = 0.01  # seconds
+INTERACTIONS_MAX_TIMESTAMP_SKEW: int = 300  # seconds either way, older signed requests could be replays
+
+METRICS_LATENCY_BUCKETS: tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)  # seconds
+
+CACHE_BACKEND_KEY_PREFIX: str = "pk-utility:"
+CACHE_BACKEND_INVALIDATION_CHANNEL: str = "pk-utility:invalidate"
+CACHE_BACKEND_TIMEOUT: float = 0.5  # seconds before a shared cache lookup counts as a miss
+CACHE_BACKEND_RECONNECT_DELAY: float = 1.0  # seconds
+CACHE_BACKEND_WRITE_DELAY: float = 1.0  # seconds switch pages are batched for before one shared write
+CACHE_BACKEND_MEMORY_MAX_ENTRIES: int = 100_000
+CACHE_SNAPSHOT_MAX_AGE: int = 86400  # seconds a snapshot's never-expiring entries (configs) are trusted for
+CACHE_SNAPSHOT_BATCH_SIZE: int = 500  # entries handled between yields to the event loop
+
+STALE_DATA_NOTICE: str = "-# ⚠️ PluralKit isn't responding right now, so this was answered from cached data and may be out of date."
+PLURALKIT_UNAVAILABLE_MESSAGE: str = "PluralKit is not responding right now, please try again in a moment."
+NOT_WHITELISTED_MESSAGE: str = "You have not been whitelisted to see this systems front history."
+SYSTEM_NOT_FOUND_MESSAGE: str = "This account is not registered as a system with PluralKit."
+OWN_SYSTEM_NOT_FOUND_MESSAGE: str = "Your account is not registered as a system with PluralKit."
+FRONT_HISTORY_PRIVATE_MESSAGE: str = "This system's PluralKit front history is private and has not provided a PluralKit token to this app (`/config pk-token set`)."
+OWN_FRONT_HISTORY_PRIVATE_MESSAGE: str = "Your PluralKit front history is private, set your PluralKit token (`/config pk-token set`) so this app can read it."
+UNKNOWN_ERROR_MESSAGE: str = "An unknown error has occurred."
@@ -0,0 +1,180 @@
+from asyncio import Future, Queue, Task, create_task, get_running_loop
+from collections.abc import AsyncIterator, Iterable, Sequence
+from sqlite3 import Row
+from time import perf_counter
+from typing import Any
+
+from aiosqlite import Connection
+from aiosqlite import connect as aio_connect
+
+from utils.constants import (
+    DATABASE_BUSY_TIMEOUT,
+    DATABASE_CACHED_STATEMENTS,
+    DATABASE_FETCH_BATCH_SIZE,
+    DATABASE_WRITE_BATCH_SIZE,
+)
+from utils.metrics import metrics
+
+
+__all__: tuple[str, ...] = (
+    "Database",
+)
+
+
+type _Statements = list[tuple[str, list[Sequence[Any]]]]
+type _WriteJob = tuple[_Statements, Future[None]]
+
+
+class Database:
+    __slots__: tuple[str, ...] = (
+        'path',
+        'reads',
+        'writes',
+        '_reader',
+        '_writer',
+        '_write_queue',
+        '_writer_task',
+    )
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.reads = 0
+        self.writes = 0
+        self._reader: Connection | None = None
+        self._writer: Connection | None = None
+        self._write_queue: Queue[_WriteJob | None] = Queue()
+        self._writer_task: Task[None] | None = None
+
+    async def _connect(self) -> Connection:
+        # isolation_level=None hands transaction control to us rather than the sqlite3 module.
+        connection = await aio_connect(
+            self.path,
+            isolation_level=None,
+            cached_statements=DATABASE_CACHED_STATEMENTS,
+        )
+        connection.row_factory = Row
+        await connection.execute("PRAGMA journal_mode=WAL;")
+        await connection.execute("PRAGMA synchronous=NORMAL;")
+        await connection.execute(f"PRAGMA busy_timeout={DATABASE_BUSY_TIMEOUT};")
+        await connection.execute("PRAGMA temp_store=MEMORY;")
+        return connection
+
+    async def start(self) -> None:
+        if self._writer_task is not None:
+            return
+        self._writer = await self._connect()
+        self._reader = await self._connect()
+        self._writer_task = create_task(self._write_loop())
+
+    async def close(self) -> None:
+        if self._writer_task is not None:
+            await self._write_queue.put(None)
+            await self._writer_task
+            self._writer_task = None
+        for connection in (self._reader, self._writer):
+            if connection is not None:
+                await connection.close()
+        self._reader = None
+        self._writer = None
+
+    @property
+    def reader(self) -> Connection:
+        if self._reader is None:
+            raise RuntimeError("The database has not been started.")
+        return self._reader
+
+    @property
+    def pending_writes(self) -> int:
+        return self._write_queue.qsize()
+
+    async def fetchone(self, query: str, args: Sequence[Any] = ()) -> Row | None:
+        self.reads += 1
+        started = perf_counter()
+        async with self.reader.execute(query, args) as cursor:
+            row = await cursor.fetchone()
+        metrics.observe('database_read_seconds', perf_counter() - started)
+        return row
+
+    async def fetchall(self, query: str, args: Sequence[Any] = ()) -> list[Row]:
+        self.reads += 1
+        started = perf_counter()
+        async with self.reader.execute(query, args) as cursor:
+            rows = list(await cursor.fetchall())
+        metrics.observe('database_read_seconds', perf_counter() - started)
+        return rows
+
+    async def iterate(self, query: str, args: Sequence[Any] = ()) -> AsyncIterator[Row]:
+        self.reads += 1
+        async with self.reader.execute(query, args) as cursor:
+            while rows := await cursor.fetchmany(DATABASE_FETCH_BATCH_SIZE):
+                for row in rows:
+                    yield row
+
+    async def execute(self, query: str, args: Sequence[Any] = ()) -> None:
+        await self.executemany(query, (args,))
+
+    async def executemany(self, query: str, args: Iterable[Sequence[Any]]) -> None:
+        await self.transaction([(query, args)])
+
+    async def transaction(self, statements: Iterable[tuple[str, Iterable[Sequence[Any]]]]) -> None:
+        if self._writer_task is None:
+            raise RuntimeError("The database has not been started.")
+        future: Future[None] = get_running_loop().create_future()
+        job = [(query, list(args)) for query, args in statements]
+        self.writes += len(job)
+        started = perf_counter()
+        await self._write_queue.put((job, future))
+        await future
+        metrics.observe('database_write_seconds', perf_counter() - started)
+
+    async def _write_loop(self) -> None:
+        assert self._writer is not None
+        while True:
+            job = await self._write_queue.get()
+            if job is None:
+                return
+
+            # Group-commit everything that queued up while the previous batch was being written.
+            batch: list[_WriteJob] = [job]
+            closing = False
+            while len(batch) < DATABASE_WRITE_BATCH_SIZE and not self._write_queue.empty():
+                next_job = self._write_queue.get_nowait()
+                if next_job is None:
+                    closing = True
+                    break
+                batch.append(next_job)
+
+            started = perf_counter()
+            await self._write_batch(self._writer, batch)
+            metrics.observe('database_write_batch_seconds', perf_counter() - started)
+            metrics.increment('database_write_jobs_total', len(batch))
+            if closing:
+                return
+
+    async def _write_batch(self, writer: Connection, batch: list[_WriteJob]) -> None:
+        failures: dict[int, BaseException] = {}
+        try:
+            await writer.execute("BEGIN IMMEDIATE;")
+            for index, (statements, _) in enumerate(batch):
+                # A savepoint per job keeps one failing write from rolling back the rest of the batch.
+                await writer.execute("SAVEPOINT write_job;")
+                try:
+                    for query, args in statements:
+                        await writer.executemany(query, args)
+                except Exception as error:
+                    failures[index] = error
+                    await writer.execute("ROLLBACK TO write_job;")
+                await writer.execute("RELEASE write_job;")
+            await writer.execute("COMMIT;")
+        except Exception as error:
+            if writer.in_transaction:
+                await writer.execute("ROLLBACK;")
+            failures = {index: error for index in range(len(batch))}
+
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in failures:
+                future.set_exception(failures[index])
+            else:
+                future.set_result(None)
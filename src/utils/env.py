@@ -11,6 +11,34 @@ __all__: tuple[str, ...] = (
     "DISCORD_BOT_TOKEN",
     "DATABASE_NAME",
     "YOUR_DISCORD_USER_ID",
+    "MEMBER_CACHE_TTL",
+    "MEMBER_CACHE_STALE_TTL",
+    "MEMBER_CACHE_MAX_SYSTEMS",
+    "MEMBER_CACHE_MAX_MEMBERS",
+    "FRONTER_CACHE_MAX_MEMBERS",
+    "SWITCH_CACHE_TTL",
+    "SWITCH_CACHE_MAX_SYSTEMS",
+    "SWITCH_CACHE_MAX_SWITCHES",
+    "SWITCH_CACHE_PERSIST",
+    "SWITCH_HISTORY_RETENTION",
+    "NON_SYSTEM_CACHE_TTL",
+    "NON_SYSTEM_CACHE_MAX_USERS",
+    "WHITELIST_CACHE_TTL",
+    "WHITELIST_CACHE_MAX_OWNERS",
+    "WHITELIST_CACHE_MAX_ENTRIES",
+    "USER_CONFIG_CACHE_TTL",
+    "USER_CONFIG_CACHE_MAX_USERS",
+    "PLURALKIT_API_URL",
+    "DISCORD_PUBLIC_KEY",
+    "INTERACTIONS_HOST",
+    "INTERACTIONS_PORT",
+    "INTERACTIONS_WORKERS",
+    "METRICS_HOST",
+    "METRICS_PORT",
+    "CACHE_BACKEND_URL",
+    "CACHE_SNAPSHOT_ENABLED",
+    "CACHE_SNAPSHOT_PATH",
+    "CACHE_SNAPSHOT_INTERVAL",
 )
 
 
@@ -21,10 +49,10 @@ def _get_boolean(key: str, *, default: bool = False) -> bool:
     return value.lower() == "true"
 
 
-def _get_int(key: str) -> int:
+def _get_int(key: str, *, default: int = 0) -> int:
     value = getenv(key)
     if value is None or value == "null":
-        return 0
+        return default
     return int(value)
 
 
@@ -51,3 +79,31 @@ def _get_optional_str(key: str) -> str | None:
 DISCORD_BOT_TOKEN: str = _get_str("DISCORD_BOT_TOKEN")
 DATABASE_NAME: str = _get_str("DATABASE_NAME") + ".db"
 YOUR_DISCORD_USER_ID: int = _get_int("YOUR_DISCORD_USER_ID")
+MEMBER_CACHE_TTL: int = _get_int("MEMBER_CACHE_TTL", default=300)
+MEMBER_CACHE_STALE_TTL: int = _get_int("MEMBER_CACHE_STALE_TTL", default=3600)
+MEMBER_CACHE_MAX_SYSTEMS: int = _get_int("MEMBER_CACHE_MAX_SYSTEMS", default=2048)
+MEMBER_CACHE_MAX_MEMBERS: int = _get_int("MEMBER_CACHE_MAX_MEMBERS", default=500_000)
+FRONTER_CACHE_MAX_MEMBERS: int = _get_int("FRONTER_CACHE_MAX_MEMBERS", default=200_000)
+SWITCH_CACHE_TTL: int = _get_int("SWITCH_CACHE_TTL", default=86400)
+SWITCH_CACHE_MAX_SYSTEMS: int = _get_int("SWITCH_CACHE_MAX_SYSTEMS", default=4096)
+SWITCH_CACHE_MAX_SWITCHES: int = _get_int("SWITCH_CACHE_MAX_SWITCHES", default=1_000_000)
+SWITCH_CACHE_PERSIST: bool = _get_boolean("SWITCH_CACHE_PERSIST", default=False)
+SWITCH_HISTORY_RETENTION: int = _get_int("SWITCH_HISTORY_RETENTION", default=30 * 86400)
+NON_SYSTEM_CACHE_TTL: int = _get_int("NON_SYSTEM_CACHE_TTL", default=300)
+NON_SYSTEM_CACHE_MAX_USERS: int = _get_int("NON_SYSTEM_CACHE_MAX_USERS", default=50_000)
+WHITELIST_CACHE_TTL: int = _get_int("WHITELIST_CACHE_TTL", default=600)
+WHITELIST_CACHE_MAX_OWNERS: int = _get_int("WHITELIST_CACHE_MAX_OWNERS", default=10_000)
+WHITELIST_CACHE_MAX_ENTRIES: int = _get_int("WHITELIST_CACHE_MAX_ENTRIES", default=1_000_000)
+USER_CONFIG_CACHE_TTL: int = _get_int("USER_CONFIG_CACHE_TTL", default=600)
+USER_CONFIG_CACHE_MAX_USERS: int = _get_int("USER_CONFIG_CACHE_MAX_USERS", default=50_000)
+PLURALKIT_API_URL: str | None = _get_optional_str("PLURALKIT_API_URL")
+DISCORD_PUBLIC_KEY: str | None = _get_optional_str("DISCORD_PUBLIC_KEY")
+INTERACTIONS_HOST: str = _get_optional_str("INTERACTIONS_HOST") or "0.0.0.0"
+INTERACTIONS_PORT: int = _get_int("INTERACTIONS_PORT", default=8080)
+INTERACTIONS_WORKERS: int = _get_int("INTERACTIONS_WORKERS", default=1)
+METRICS_HOST: str = _get_optional_str("METRICS_HOST") or "127.0.0.1"
+METRICS_PORT: int | None = _get_optional_int("METRICS_PORT")
+CACHE_BACKEND_URL: str | None = _get_optional_str("CACHE_BACKEND_URL")
+CACHE_SNAPSHOT_ENABLED: bool = _get_boolean("CACHE_SNAPSHOT_ENABLED", default=True)
+CACHE_SNAPSHOT_PATH: str = _get_optional_str("CACHE_SNAPSHOT_PATH") or _get_str("DATABASE_NAME") + ".cache"
+CACHE_SNAPSHOT_INTERVAL: int = _get_int("CACHE_SNAPSHOT_INTERVAL", default=300)
@@ -1,19 +1,56 @@
 from datetime import datetime
+from re import compile as re_compile
 from typing import Any
 
+from utils.constants import (
+    DISCORD_MESSAGE_MAX_LENGTH,
+    FRONT_HISTORY_PRIVATE_MESSAGE,
+    OWN_FRONT_HISTORY_PRIVATE_MESSAGE,
+    OWN_SYSTEM_NOT_FOUND_MESSAGE,
+    PAGE_FOOTER_RESERVED_LENGTH,
+    PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE,
+    PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND,
+    SYSTEM_NOT_FOUND_MESSAGE,
+    UNKNOWN_ERROR_MESSAGE,
+)
+
 
 __all__: tuple[str, ...] = (
     "chunk_list",
+    "paginate_lines",
     "format_timestamp",
     "unix_to_rfc3399",
     "snowflake_to_timestamp",
+    "format_duration",
+    "parse_user_ids",
+    "front_error_message",
 )
 
 
+_USER_ID_PATTERN = re_compile(r"\d{15,20}")
+
+
 def chunk_list(input_list: list[Any], n: int) -> list[list[Any]]:
     return [input_list[i:i + n] for i in range(0, len(input_list), n)]
 
 
+def paginate_lines(lines: list[str], max_lines: int) -> list[list[str]]:
+    # Pages end at ``max_lines`` or once another line would no longer fit in one message next to the footer.
+    max_length = DISCORD_MESSAGE_MAX_LENGTH - PAGE_FOOTER_RESERVED_LENGTH
+    pages: list[list[str]] = []
+    length = 0
+    for line in lines:
+        if len(line) > max_length:
+            line = line[:max_length - 1] + "…"
+        if pages and len(pages[-1]) < max_lines and length + 1 + len(line) <= max_length:
+            pages[-1].append(line)
+            length += 1 + len(line)
+        else:
+            pages.append([line])
+            length = len(line)
+    return pages
+
+
 def format_timestamp(datetime_str: str) -> datetime:
     return datetime.fromisoformat(datetime_str.replace("Z", "+00:00"))
 
@@ -28,3 +65,24 @@ def snowflake_to_timestamp(snowflake: int) -> datetime:
     discord_epoch = 1420070400000  # Discord epoch in milliseconds (January 1, 2015)
     timestamp = ((snowflake >> 22) + discord_epoch) / 1000  # Shift right by 22 bits to get the time part, then add Discord's epoch
     return datetime.utcfromtimestamp(timestamp)
+
+
+def format_duration(seconds: float) -> str:
+    days, remainder = divmod(int(seconds) // 60, 24 * 60)
+    hours, minutes = divmod(remainder, 60)
+    parts = [f"{value}{unit}" for value, unit in ((days, 'd'), (hours, 'h'), (minutes, 'm')) if value]
+    return ' '.join(parts) or '0m'
+
+
+def parse_user_ids(text: str) -> list[int]:
+    # Accepts raw IDs and mentions, separated by anything.
+    return list(dict.fromkeys(int(match) for match in _USER_ID_PATTERN.findall(text)))
+
+
+def front_error_message(error_code: int, *, own_system: bool = False) -> str:
+    # ``own_system`` words the message for someone looking at their own system rather than another one.
+    if error_code == PLURALKIT_API_ERROR_SYSTEM_FRONT_HISTORY_PRIVATE:
+        return OWN_FRONT_HISTORY_PRIVATE_MESSAGE if own_system else FRONT_HISTORY_PRIVATE_MESSAGE
+    if error_code == PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND:
+        return OWN_SYSTEM_NOT_FOUND_MESSAGE if own_system else SYSTEM_NOT_FOUND_MESSAGE
+    return UNKNOWN_ERROR_MESSAGE
@@ -0,0 +1,138 @@
+from bisect import bisect_left
+from collections.abc import Callable
+
+from aiohttp import web
+
+from utils.constants import METRICS_LATENCY_BUCKETS
+
+
+__all__: tuple[str, ...] = (
+    "Histogram",
+    "Metrics",
+    "metrics",
+)
+
+
+type _Labels = tuple[tuple[str, str], ...]
+
+
+def _format_labels(labels: _Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    __slots__: tuple[str, ...] = (
+        'bounds',
+        'counts',
+        'total',
+        'count',
+    )
+
+    def __init__(self, bounds: tuple[float, ...] = METRICS_LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        # One slot per bound plus the +Inf overflow, kept non-cumulative so observing is a single increment.
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation, which is as precise as the buckets allow.
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    __slots__: tuple[str, ...] = (
+        '_histograms',
+        '_counters',
+        '_gauges',
+    )
+
+    def __init__(self) -> None:
+        self._histograms: dict[str, dict[_Labels, Histogram]] = {}
+        self._counters: dict[str, dict[_Labels, int]] = {}
+        self._gauges: dict[str, dict[_Labels, Callable[[], float]]] = {}
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        series = self._histograms.setdefault(name, {})
+        key = tuple(labels.items())
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def increment(self, name: str, amount: int = 1, **labels: str) -> None:
+        series = self._counters.setdefault(name, {})
+        key = tuple(labels.items())
+        series[key] = series.get(key, 0) + amount
+
+    def gauge(self, name: str, read: Callable[[], float], **labels: str) -> None:
+        # Gauges are read when rendered, so keeping them up to date costs nothing on the hot path.
+        self._gauges.setdefault(name, {})[tuple(labels.items())] = read
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for name, series in sorted(self._counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name, gauges in sorted(self._gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, read in gauges.items():
+                lines.append(f"{name}{_format_labels(labels)} {read()}")
+        for name, histograms in sorted(self._histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in histograms.items():
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, f'le="{bound}"')} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, 'le="+Inf"')} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        lines: list[str] = []
+        for name, histograms in sorted(self._histograms.items()):
+            for labels, histogram in sorted(histograms.items()):
+                lines.append(
+                    f"{name}{_format_labels(labels)} n={histogram.count} "
+                    f"p50<={histogram.quantile(0.5) * 1000:g}ms p99<={histogram.quantile(0.99) * 1000:g}ms"
+                )
+        for name, gauges in sorted(self._gauges.items()):
+            for labels, read in gauges.items():
+                lines.append(f"{name}{_format_labels(labels)} {read():g}")
+        for name, series in sorted(self._counters.items()):
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines)
+
+    async def serve(self, host: str, port: int) -> web.AppRunner:
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(text=self.render(), content_type='text/plain')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+metrics: Metrics = Metrics()
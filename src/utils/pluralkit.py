@@ -0,0 +1,235 @@
+from asyncio import get_running_loop, sleep
+from collections.abc import Callable, Hashable
+from json import loads
+from random import uniform
+from time import perf_counter
+from typing import Any, NoReturn
+
+from aiohttp import ClientError, ClientResponse, ClientSession, ClientTimeout, TCPConnector
+
+from utils.constants import (
+    PLURALKIT_API_BASE_URL,
+    PLURALKIT_CIRCUIT_FAILURE_RATIO,
+    PLURALKIT_CIRCUIT_MIN_REQUESTS,
+    PLURALKIT_CIRCUIT_OPEN_FOR,
+    PLURALKIT_CIRCUIT_WINDOW,
+    PLURALKIT_HTTP_CONNECT_TIMEOUT,
+    PLURALKIT_HTTP_DNS_CACHE_TTL,
+    PLURALKIT_HTTP_KEEPALIVE_TIMEOUT,
+    PLURALKIT_HTTP_POOL_SIZE,
+    PLURALKIT_HTTP_REQUEST_TIMEOUT,
+    PLURALKIT_HTTP_USER_AGENT,
+    PLURALKIT_RATE_LIMIT_BURST,
+    PLURALKIT_RATE_LIMIT_PER_SECOND,
+    PLURALKIT_REQUEST_DEADLINE,
+    PLURALKIT_RETRY_ATTEMPTS,
+    PLURALKIT_RETRY_BASE_DELAY,
+)
+from utils.circuit import CircuitBreaker
+from utils.metrics import metrics
+from utils.ratelimit import RateLimiter
+from utils.types import Member, Switch
+
+
+__all__: tuple[str, ...] = (
+    "PluralKitClient",
+    "PluralKitUnavailable",
+    "parse_members",
+    "parse_switches",
+    "parse_switch_members",
+)
+
+
+class PluralKitUnavailable(Exception):
+    pass
+
+
+def _error_code(data: Any) -> int | None:
+    if type(data) == dict and 'code' in data:
+        return int(data['code'])
+    return None
+
+
+def parse_members(raw: bytes) -> dict[str, Member] | int:
+    data = loads(raw)
+    error_code = _error_code(data)
+    if error_code is not None:
+        return error_code
+    return {m.id: m for m in map(Member.from_api, data)}
+
+
+def parse_switches(raw: bytes) -> list[Switch] | int:
+    data = loads(raw)
+    error_code = _error_code(data)
+    if error_code is not None:
+        return error_code
+    return [Switch.from_api(s) for s in data]
+
+
+def parse_switch_members(raw: bytes) -> dict[str, Member] | int:
+    # A single switch embeds full member objects rather than ids.
+    data = loads(raw)
+    error_code = _error_code(data)
+    if error_code is not None:
+        return error_code
+    return {m.id: m for m in map(Member.from_api, data['members'])}
+
+
+async def _retry_after(resp: ClientResponse) -> float:
+    # The body's retry_after (milliseconds) is preferred, then the Retry-After header (seconds); either can be missing
+    # or garbled, in which case this gives 0 and the caller's own backoff stands.
+    try:
+        body = loads(await resp.read())
+        if isinstance(body, dict) and body.get('retry_after') is not None:
+            return float(body['retry_after']) / 1000
+    except (ValueError, TypeError):
+        pass
+    try:
+        return float(resp.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0
+
+
+def _endpoint(url: str) -> str:
+    # One metrics label per route rather than one per system or switch.
+    parts = url.split('/')
+    if len(parts) > 3:
+        parts[3] = '{system}'
+    if len(parts) > 5:
+        parts[5] = '{switch}'
+    return '/'.join(parts)
+
+
+class PluralKitClient:
+    __slots__: tuple[str, ...] = (
+        'base_url',
+        'rate_limiter',
+        'breaker',
+        'in_flight',
+        '_session',
+    )
+
+    def __init__(self, base_url: str = PLURALKIT_API_BASE_URL) -> None:
+        self.base_url = base_url
+        self.rate_limiter = RateLimiter(PLURALKIT_RATE_LIMIT_PER_SECOND, PLURALKIT_RATE_LIMIT_BURST)
+        self.breaker = CircuitBreaker(
+            window=PLURALKIT_CIRCUIT_WINDOW,
+            min_requests=PLURALKIT_CIRCUIT_MIN_REQUESTS,
+            failure_ratio=PLURALKIT_CIRCUIT_FAILURE_RATIO,
+            open_for=PLURALKIT_CIRCUIT_OPEN_FOR,
+        )
+        self.in_flight = 0
+        self._session: ClientSession | None = None
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("The PluralKit client has not been started.")
+        return self._session
+
+    async def start(self) -> None:
+        if self._session is not None and not self._session.closed:
+            return
+        connector = TCPConnector(
+            limit=PLURALKIT_HTTP_POOL_SIZE,
+            limit_per_host=PLURALKIT_HTTP_POOL_SIZE,
+            ttl_dns_cache=PLURALKIT_HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=PLURALKIT_HTTP_KEEPALIVE_TIMEOUT,
+        )
+        self._session = ClientSession(
+            base_url=self.base_url,
+            connector=connector,
+            timeout=ClientTimeout(
+                total=PLURALKIT_HTTP_REQUEST_TIMEOUT,
+                connect=PLURALKIT_HTTP_CONNECT_TIMEOUT,
+            ),
+            headers={'User-Agent': PLURALKIT_HTTP_USER_AGENT},
+        )
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def __reject(self, endpoint: str) -> NoReturn:
+        metrics.increment('pluralkit_circuit_rejected_total', endpoint=endpoint)
+        metrics.increment('pluralkit_unavailable_total')
+        raise PluralKitUnavailable("PluralKit has been failing, so requests to it are paused for now.")
+
+    async def get[T](
+        self,
+        url: str,
+        *,
+        parse: Callable[[bytes], T] = loads,
+        headers: dict[str, str] | None = None,
+        params: dict[str, Any] | None = None,
+        key: Hashable = None,
+        deadline: float | None = None,
+    ) -> T:
+        loop = get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + PLURALKIT_REQUEST_DEADLINE
+
+        endpoint = _endpoint(url)
+        for attempt in range(PLURALKIT_RETRY_ATTEMPTS + 1):
+            # Checked before queueing for the rate limit as well, so an outage never holds anyone up.
+            if self.breaker.rejecting:
+                self.__reject(endpoint)
+            if not await self.rate_limiter.acquire(key, deadline=deadline):
+                metrics.increment('pluralkit_unavailable_total')
+                raise PluralKitUnavailable("Timed out waiting for the PluralKit rate limit.")
+
+            retry_after = PLURALKIT_RETRY_BASE_DELAY * 2 ** attempt
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if not self.breaker.allow():
+                self.__reject(endpoint)
+            started = perf_counter()
+            status = 'error'
+            success: bool | None = None
+            self.in_flight += 1
+            try:
+                async with self.session.get(
+                    url=url,
+                    headers=headers,
+                    params=params,
+                    timeout=ClientTimeout(
+                        total=min(PLURALKIT_HTTP_REQUEST_TIMEOUT, remaining),
+                        connect=PLURALKIT_HTTP_CONNECT_TIMEOUT,
+                    ),
+                ) as resp:
+                    status = str(resp.status)
+                    if resp.status >= 500:
+                        success = False
+                    self.rate_limiter.update_from_headers(resp.headers)
+                    if resp.status == 429:
+                        retry_after = max(retry_after, await _retry_after(resp))
+                        self.rate_limiter.block_for(retry_after)
+                    elif resp.status < 500:
+                        try:
+                            result = parse(await resp.read())
+                        except ValueError:
+                            # Not JSON (a proxy's error page, say), so no better than a 5xx.
+                            success = False
+                        else:
+                            success = True
+                            if type(result) == int:
+                                metrics.increment('pluralkit_error_codes_total', endpoint=endpoint, code=str(result))
+                            return result
+            except (ClientError, TimeoutError):
+                success = False
+            finally:
+                self.in_flight -= 1
+                self.breaker.record(success)
+                metrics.observe('pluralkit_request_seconds', perf_counter() - started, endpoint=endpoint)
+                metrics.increment('pluralkit_responses_total', endpoint=endpoint, status=status)
+
+            # Full jitter keeps every queued request from retrying in the same instant.
+            delay = uniform(retry_after / 2, retry_after)
+            if loop.time() + delay >= deadline:
+                break
+            await sleep(delay)
+
+        metrics.increment('pluralkit_unavailable_total')
+        raise PluralKitUnavailable("PluralKit did not respond successfully in time.")
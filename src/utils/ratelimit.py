@@ -0,0 +1,106 @@
+from asyncio import Future, Task, create_task, get_running_loop, sleep, wait_for
+from collections import OrderedDict, deque
+from collections.abc import Hashable, Mapping
+from time import time as unix_time
+
+
+__all__: tuple[str, ...] = (
+    "RateLimiter",
+)
+
+
+class RateLimiter:
+    # Token bucket shared by every shard, handing tokens out round-robin between keys so one busy
+    # system can't starve everyone else queued behind it.
+    __slots__: tuple[str, ...] = (
+        'rate',
+        'capacity',
+        'throttled',
+        '_tokens',
+        '_updated_at',
+        '_blocked_until',
+        '_waiters',
+        '_dispatcher',
+    )
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.throttled = 0
+        self._tokens = float(capacity)
+        self._updated_at = 0.0
+        self._blocked_until = 0.0
+        self._waiters: OrderedDict[Hashable, deque[Future[None]]] = OrderedDict()
+        self._dispatcher: Task[None] | None = None
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _refill(self, now: float) -> None:
+        if self._updated_at:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _delay(self, now: float) -> float:
+        self._refill(now)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0.0
+
+    async def acquire(self, key: Hashable, *, deadline: float) -> bool:
+        loop = get_running_loop()
+        now = loop.time()
+        if not self._waiters and self._delay(now) == 0:
+            self._tokens -= 1
+            return True
+
+        self.throttled += 1
+        future: Future[None] = loop.create_future()
+        self._waiters.setdefault(key, deque()).append(future)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = create_task(self._dispatch())
+        try:
+            await wait_for(future, timeout=max(deadline - now, 0))
+        except TimeoutError:
+            return False
+        return True
+
+    async def _dispatch(self) -> None:
+        loop = get_running_loop()
+        while self._waiters:
+            delay = self._delay(loop.time())
+            if delay > 0:
+                await sleep(delay)
+                continue
+
+            key, waiters = next(iter(self._waiters.items()))
+            future = waiters.popleft()
+            if waiters:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            # Waiters that already gave up (deadline passed) don't get to spend a token.
+            if not future.done():
+                self._tokens -= 1
+                future.set_result(None)
+
+    def block_for(self, seconds: float) -> None:
+        now = get_running_loop().time()
+        self._blocked_until = max(self._blocked_until, now + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is None:
+            return
+        now = get_running_loop().time()
+        self._refill(now)
+        self._tokens = min(self._tokens, float(remaining))
+        if int(remaining) <= 0 and reset is not None:
+            reset_at = float(reset)
+            if reset_at > 1e11:  # milliseconds
+                reset_at /= 1000
+            self.block_for(max(reset_at - unix_time(), 0))
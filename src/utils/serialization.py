@@ -0,0 +1,139 @@
+from collections.abc import Callable
+from struct import Struct
+from sys import intern
+
+from utils.switches import SwitchIndex
+from utils.types import Member, Switch
+
+
+__all__: tuple[str, ...] = (
+    "pack_roster",
+    "unpack_roster",
+    "pack_switch_index",
+    "unpack_switch_index",
+    "pack_expiring",
+    "unpack_expiring",
+)
+
+
+# Every blob starts with a format version, so anything written by an older layout reads as a miss.
+_VERSION: int = 1
+_HEADER = Struct('<BI')
+_MEMBER = Struct('<HHHBq')
+_SWITCH = Struct('<dHH')
+_UINT32 = Struct('<I')
+_COVERAGE = Struct('<dd')
+_UINT16 = Struct('<H')
+_EXPIRES_AT = Struct('<d')
+_NO_DISPLAY_NAME: int = 0xFFFF
+
+
+class _Reader:
+    __slots__: tuple[str, ...] = (
+        'data',
+        'offset',
+    )
+
+    def __init__(self, data: bytes) -> None:
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, struct: Struct) -> tuple:
+        values = struct.unpack_from(self.data, self.offset)
+        self.offset += struct.size
+        return values
+
+    def text(self, length: int) -> str:
+        value = str(self.data[self.offset:self.offset + length], 'utf-8')
+        self.offset += length
+        return value
+
+
+def _read_header(reader: _Reader) -> int:
+    version, count = reader.unpack(_HEADER)
+    if version != _VERSION:
+        raise ValueError(f"Unsupported cache blob version {version}.")
+    return count
+
+
+def pack_roster(members: dict[str, Member]) -> bytes:
+    parts = [_HEADER.pack(_VERSION, len(members))]
+    for member in members.values():
+        member_id = member.id.encode()
+        name = member.name.encode()
+        display_name = b"" if member.display_name is None else member.display_name.encode()
+        parts.append(_MEMBER.pack(
+            len(member_id),
+            len(name),
+            _NO_DISPLAY_NAME if member.display_name is None else len(display_name),
+            member.private,
+            member.message_count,
+        ))
+        parts += (member_id, name, display_name)
+    return b"".join(parts)
+
+
+def unpack_roster(data: bytes) -> dict[str, Member]:
+    reader = _Reader(data)
+    members: dict[str, Member] = {}
+    for _ in range(_read_header(reader)):
+        id_length, name_length, display_name_length, private, message_count = reader.unpack(_MEMBER)
+        member_id = intern(reader.text(id_length))
+        name = reader.text(name_length)
+        display_name = None if display_name_length == _NO_DISPLAY_NAME else reader.text(display_name_length)
+        members[member_id] = Member(member_id, name, display_name, bool(private), message_count)
+    return members
+
+
+def pack_switch_index(index: SwitchIndex) -> bytes:
+    # Member ids repeat across most switches, so they're written once and referenced by position.
+    member_ids: dict[str, int] = {}
+    for switch in index.switches:
+        for member_id in switch.members:
+            member_ids.setdefault(member_id, len(member_ids))
+
+    parts = [_HEADER.pack(_VERSION, len(member_ids))]
+    for member_id in member_ids:
+        encoded = member_id.encode()
+        parts += (_UINT16.pack(len(encoded)), encoded)
+    parts.append(_UINT16.pack(len(index.coverage)))
+    parts += (_COVERAGE.pack(start, end) for start, end in index.coverage)
+    parts.append(_UINT32.pack(len(index.switches)))
+    for switch in index.switches:
+        switch_id = switch.id.encode()
+        parts += (_SWITCH.pack(switch.timestamp, len(switch_id), len(switch.members)), switch_id)
+        parts += (_UINT32.pack(member_ids[member_id]) for member_id in switch.members)
+    return b"".join(parts)
+
+
+def unpack_switch_index(data: bytes) -> SwitchIndex:
+    reader = _Reader(data)
+    member_ids: list[str] = []
+    for _ in range(_read_header(reader)):
+        length, = reader.unpack(_UINT16)
+        member_ids.append(intern(reader.text(length)))
+
+    index = SwitchIndex()
+    coverage_count, = reader.unpack(_UINT16)
+    for _ in range(coverage_count):
+        index.add_coverage(*reader.unpack(_COVERAGE))
+
+    switch_count, = reader.unpack(_UINT32)
+    switches: list[Switch] = []
+    for _ in range(switch_count):
+        timestamp, id_length, member_count = reader.unpack(_SWITCH)
+        switch_id = reader.text(id_length)
+        members = tuple(member_ids[reader.unpack(_UINT32)[0]] for _ in range(member_count))
+        switches.append(Switch(switch_id, timestamp, members))
+    index.add_switches(switches)
+    return index
+
+
+def pack_expiring(blob: bytes, expires_at: float) -> bytes:
+    # Prefixes a blob with when it expires (wall clock), for values whose age has to survive being passed on.
+    return _EXPIRES_AT.pack(expires_at) + blob
+
+
+def unpack_expiring[T](data: bytes, unpack: Callable[[bytes], T]) -> tuple[float, T]:
+    expires_at, = _EXPIRES_AT.unpack_from(data)
+    return expires_at, unpack(data[_EXPIRES_AT.size:])
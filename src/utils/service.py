@@ -1,16 +1,80 @@
+from asyncio import Task, create_task, gather, sleep
 from datetime import datetime
+from hashlib import sha256
+from json import dumps, loads
+from math import inf
+from secrets import token_hex
+from struct import error as StructError
+from sys import intern
+from time import monotonic, time as unix_time
 from typing import TYPE_CHECKING
 
-from sqlite3 import Row
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
 from typing import Any, cast
 
-from aiohttp import ClientSession
-from aiosqlite import connect as aio_connect
+from aiohttp import web
 from discord.ext.commands import AutoShardedBot
 
-from utils.env import DATABASE_NAME
+from utils.backends import CacheBackend, open_backend
+from utils.cache import TTLCache
+from utils.cache_snapshot import read_cache_snapshot, restore_cache_snapshot, save_cache_snapshot
+from utils.constants import (
+    CACHE_BACKEND_INVALIDATION_CHANNEL,
+    CACHE_BACKEND_KEY_PREFIX,
+    CACHE_BACKEND_WRITE_DELAY,
+    PLURALKIT_API_BASE_URL,
+    PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND,
+    PLURALKIT_SWITCH_PAGE_SIZE,
+    SNAPSHOT_DAILY_RETENTION,
+    SNAPSHOT_INTERVAL,
+    SNAPSHOT_WEEKLY_RETENTION,
+)
+from utils.database import Database
+from utils.env import (
+    CACHE_BACKEND_URL,
+    CACHE_SNAPSHOT_ENABLED,
+    CACHE_SNAPSHOT_INTERVAL,
+    CACHE_SNAPSHOT_PATH,
+    DATABASE_NAME,
+    MEMBER_CACHE_MAX_MEMBERS,
+    MEMBER_CACHE_MAX_SYSTEMS,
+    MEMBER_CACHE_STALE_TTL,
+    MEMBER_CACHE_TTL,
+    METRICS_HOST,
+    METRICS_PORT,
+    FRONTER_CACHE_MAX_MEMBERS,
+    NON_SYSTEM_CACHE_MAX_USERS,
+    NON_SYSTEM_CACHE_TTL,
+    PLURALKIT_API_URL,
+    SWITCH_CACHE_MAX_SWITCHES,
+    SWITCH_CACHE_MAX_SYSTEMS,
+    SWITCH_CACHE_PERSIST,
+    SWITCH_CACHE_TTL,
+    SWITCH_HISTORY_RETENTION,
+    USER_CONFIG_CACHE_MAX_USERS,
+    USER_CONFIG_CACHE_TTL,
+    WHITELIST_CACHE_MAX_ENTRIES,
+    WHITELIST_CACHE_MAX_OWNERS,
+    WHITELIST_CACHE_TTL,
+)
 from utils.functions import unix_to_rfc3399
-from utils.types import FrontMemberVisibility, SwitchAPI, UserConfig
+from utils.metrics import metrics
+from utils.circuit import CIRCUIT_CLOSED
+from utils.pluralkit import PluralKitClient, PluralKitUnavailable, parse_members, parse_switch_members, parse_switches
+from utils.serialization import (
+    pack_expiring,
+    pack_roster,
+    pack_switch_index,
+    unpack_expiring,
+    unpack_roster,
+    unpack_switch_index,
+)
+from utils.singleflight import SingleFlight
+from utils.snapshots import pack_message_counts, unpack_message_counts
+from utils.staleness import mark_stale
+from utils.stats import RosterStats
+from utils.switches import SwitchIndex
+from utils.types import FrontMemberVisibility, Member, Switch, UserConfig
 
 
 type PluralKitDMUtilities = AutoShardedBot
@@ -28,57 +92,910 @@ __all__: tuple[str, ...] = (
 class Service:
     __slots__: tuple[str, ...] = (
         'bot',
+        'pluralkit',
+        'database',
+        'member_cache',
+        'fronter_cache',
+        'switch_cache',
+        'in_flight',
+        'private_front_history',
+        'non_system_cache',
+        'stats_cache',
+        'whitelist_cache',
+        'user_config_cache',
+        'metrics_runner',
+        'shared_cache',
+        'instance_id',
+        'shared_writes',
+        'snapshot_path',
+        'snapshot_task',
+        'snapshot_restored',
+        'config_writes',
     )
 
     def __init__(self, bot: PluralKitDMUtilities) -> None:
         self.bot = bot
+        self.pluralkit = PluralKitClient(PLURALKIT_API_URL or PLURALKIT_API_BASE_URL)
+        self.database = Database(DATABASE_NAME)
+        self.member_cache: TTLCache[tuple[int, str], dict[str, Member]] = TTLCache(
+            ttl=MEMBER_CACHE_TTL,
+            stale_ttl=MEMBER_CACHE_STALE_TTL,
+            max_entries=MEMBER_CACHE_MAX_SYSTEMS,
+            max_weight=MEMBER_CACHE_MAX_MEMBERS,
+        )
+        self.fronter_cache: TTLCache[tuple[int, str, str], Member] = TTLCache(
+            ttl=MEMBER_CACHE_TTL,
+            max_entries=FRONTER_CACHE_MAX_MEMBERS,
+        )
+        self.switch_cache: TTLCache[tuple[int, str], SwitchIndex] = TTLCache(
+            ttl=SWITCH_CACHE_TTL,
+            max_entries=SWITCH_CACHE_MAX_SYSTEMS,
+            max_weight=SWITCH_CACHE_MAX_SWITCHES,
+        )
+        self.in_flight: SingleFlight[tuple[Any, ...], Any] = SingleFlight()
+        self.private_front_history: set[int] = set()
+        self.non_system_cache: TTLCache[int, bool] = TTLCache(
+            ttl=NON_SYSTEM_CACHE_TTL,
+            max_entries=NON_SYSTEM_CACHE_MAX_USERS,
+        )
+        self.stats_cache: TTLCache[int, RosterStats] = TTLCache(
+            ttl=MEMBER_CACHE_TTL + MEMBER_CACHE_STALE_TTL,
+            max_entries=MEMBER_CACHE_MAX_SYSTEMS,
+        )
+        # Whitelists only ever change through the bot, and every change is written through here and published
+        # to the other processes over the shared cache backend (which is why running several processes requires
+        # one, see server.py). A publish can still be lost, so cached sets are also reread now and then.
+        self.whitelist_cache: TTLCache[int, set[int]] = TTLCache(
+            ttl=WHITELIST_CACHE_TTL,
+            max_entries=WHITELIST_CACHE_MAX_OWNERS,
+            max_weight=WHITELIST_CACHE_MAX_ENTRIES,
+        )
+        # Configs are written through and published on every change, and reread now and then like whitelists.
+        # A user without a config is cached as None so that checks against them don't keep hitting the database.
+        self.user_config_cache: TTLCache[int, UserConfig | None] = TTLCache(
+            ttl=USER_CONFIG_CACHE_TTL,
+            max_entries=USER_CONFIG_CACHE_MAX_USERS,
+        )
+        self.metrics_runner: web.AppRunner | None = None
+        # An optional second tier shared between processes, in front of PluralKit and behind the caches above.
+        self.shared_cache: CacheBackend | None = None if CACHE_BACKEND_URL is None else open_backend(CACHE_BACKEND_URL)
+        self.instance_id = token_hex(8)
+        self.shared_writes: dict[str, Task[None]] = {}
+        self.snapshot_path = CACHE_SNAPSHOT_PATH
+        self.snapshot_task: Task[None] | None = None
+        self.snapshot_restored = False
+        self.config_writes = 0
+        self.__register_metrics()
 
-    def format_member_name(self, member: dict[str, Any], use_display_name: bool) -> str:
-        return (member['display_name'] or member['name']) if use_display_name else member['name']
+    def __register_metrics(self) -> None:
+        caches: dict[str, TTLCache[Any, Any]] = {
+            'members': self.member_cache,
+            'fronters': self.fronter_cache,
+            'switches': self.switch_cache,
+            'non_system': self.non_system_cache,
+            'stats': self.stats_cache,
+            'whitelist': self.whitelist_cache,
+            'user_config': self.user_config_cache,
+        }
+        for name, cache in caches.items():
+            metrics.gauge('cache_entries', lambda cache=cache: len(cache), cache=name)
+            metrics.gauge('cache_hits', lambda cache=cache: cache.hits + cache.stale_hits, cache=name)
+            metrics.gauge('cache_misses', lambda cache=cache: cache.misses, cache=name)
+            metrics.gauge('cache_evictions', lambda cache=cache: cache.evictions, cache=name)
+            metrics.gauge(
+                'cache_hit_ratio',
+                lambda cache=cache: (cache.hits + cache.stale_hits) / max(cache.hits + cache.stale_hits + cache.misses, 1),
+                cache=name,
+            )
+        metrics.gauge('pluralkit_in_flight', lambda: self.pluralkit.in_flight)
+        metrics.gauge('pluralkit_circuit_state', lambda: self.pluralkit.breaker.state)
+        metrics.gauge('pluralkit_circuit_opened', lambda: self.pluralkit.breaker.opened)
+        metrics.gauge('pluralkit_rate_limit_queued', lambda: self.pluralkit.rate_limiter.queued)
+        metrics.gauge('pluralkit_rate_limit_throttled', lambda: self.pluralkit.rate_limiter.throttled)
+        metrics.gauge('singleflight_in_flight', lambda: len(self.in_flight))
+        metrics.gauge('singleflight_coalesced', lambda: self.in_flight.coalesced)
+        metrics.gauge('database_pending_writes', lambda: self.database.pending_writes)
 
-    async def __fetch_pk_api_headers(self, user_id: int) -> dict[str, str]:
-        user_token = await self.get_user_config(user_id)
-        if user_token is not None and user_token['pluralkit_token'] is not None:
-            return {'Authorization': user_token['pluralkit_token']}
+    async def start(self) -> None:
+        await self.database.start()
+        await self.pluralkit.start()
+        await self.__load_private_front_history()
+        if self.shared_cache is not None:
+            self.shared_cache.subscribe(CACHE_BACKEND_INVALIDATION_CHANNEL, self.__on_invalidation)
+            await self.shared_cache.start()
+        if METRICS_PORT is not None and self.metrics_runner is None:
+            self.metrics_runner = await metrics.serve(METRICS_HOST, METRICS_PORT)
+        if CACHE_SNAPSHOT_ENABLED and self.snapshot_task is None:
+            # Restored in the background, so the gateway connects while the caches fill back up.
+            self.snapshot_task = create_task(self.__run_cache_snapshots())
+
+    async def close(self) -> None:
+        if self.snapshot_task is not None:
+            # Waited on, since a periodic save still writing would otherwise race the final one below.
+            self.snapshot_task.cancel()
+            await gather(self.snapshot_task, return_exceptions=True)
+            self.snapshot_task = None
+        # Only once the old snapshot has been restored, or a quick restart would overwrite it with almost nothing.
+        if self.snapshot_restored:
+            await self.save_cache_snapshot(clean=True)
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+            self.metrics_runner = None
+        for task in self.shared_writes.values():
+            task.cancel()
+        self.shared_writes.clear()
+        if self.shared_cache is not None:
+            await self.shared_cache.close()
+        await self.pluralkit.close()
+        await self.database.close()
+
+    async def __run_cache_snapshots(self) -> None:
+        config_writes = self.config_writes
+        records = await read_cache_snapshot(self.snapshot_path)
+        # A config changed while the file was read is newer than the snapshot, which would otherwise
+        # put the old one back over it, so then every config is left to load from the database. With a
+        # shared backend that's never known, as other processes may have changed any config while this one
+        # was down, so configs are only restored when this process is the only one writing them.
+        restore_configs = self.shared_cache is None and self.config_writes == config_writes
+        restored = await restore_cache_snapshot(
+            records,
+            rosters=self.member_cache,
+            switches=self.switch_cache,
+            non_systems=self.non_system_cache,
+            configs=self.user_config_cache if restore_configs else None,
+        )
+        self.snapshot_restored = True
+        print(f"Restored {restored} cached entries from {self.snapshot_path}")
+        while CACHE_SNAPSHOT_INTERVAL > 0:
+            await sleep(CACHE_SNAPSHOT_INTERVAL)
+            await self.save_cache_snapshot()
+
+    async def save_cache_snapshot(self, *, clean: bool = False) -> int:
+        return await save_cache_snapshot(
+            self.snapshot_path,
+            rosters=self.member_cache,
+            switches=self.switch_cache,
+            non_systems=self.non_system_cache,
+            configs=self.user_config_cache,
+            clean=clean,
+        )
+
+    async def __get_shared[T](self, kind: str, key: str, unpack: Callable[[bytes], T]) -> T | None:
+        if self.shared_cache is None:
+            return None
+        blob = await self.shared_cache.get(CACHE_BACKEND_KEY_PREFIX + key)
+        if blob is not None:
+            try:
+                value = unpack(blob)
+            except (ValueError, IndexError, StructError):
+                value = None
+            if value is not None:
+                metrics.increment('cache_backend_requests_total', kind=kind, result='hit')
+                return value
+        metrics.increment('cache_backend_requests_total', kind=kind, result='miss')
+        return None
+
+    async def __set_shared(self, key: str, blob: bytes, ttl: float) -> None:
+        if self.shared_cache is not None:
+            await self.shared_cache.set(CACHE_BACKEND_KEY_PREFIX + key, blob, ttl=ttl)
+
+    def __schedule_shared_write(self, key: str, pack: Callable[[], tuple[bytes, float] | None]) -> None:
+        # Syncing a history fetches one page after another, so they're written out together once it settles.
+        # ``pack`` returns the blob and its TTL, or None when there's nothing left worth writing.
+        if self.shared_cache is None or key in self.shared_writes:
+            return
+
+        async def write() -> None:
+            try:
+                await sleep(CACHE_BACKEND_WRITE_DELAY)
+            finally:
+                self.shared_writes.pop(key, None)
+            packed = pack()
+            if packed is not None:
+                await self.__set_shared(key, *packed)
+
+        self.shared_writes[key] = create_task(write())
+
+    async def __publish_invalidation(self, kind: str, user_id: int) -> None:
+        if self.shared_cache is not None:
+            message = f"{self.instance_id}:{kind}:{user_id}".encode()
+            await self.shared_cache.publish(CACHE_BACKEND_INVALIDATION_CHANNEL, message)
+
+    async def __on_invalidation(self, message: bytes | None) -> None:
+        if message is None:
+            # Whatever was published while the subscription was down is lost, so every process-local
+            # copy it would have corrected is reloaded instead.
+            self.user_config_cache.clear()
+            self.whitelist_cache.clear()
+            return
+
+        origin, kind, raw_user_id = message.decode().split(':')
+        if origin == self.instance_id:
+            return
+        user_id = int(raw_user_id)
+        if kind == 'config':
+            if ('user-config', user_id) in self.in_flight:
+                await self.get_user_config(user_id)
+            self.user_config_cache.invalidate(user_id)
+        elif kind == 'whitelist':
+            if ('whitelist', user_id) in self.in_flight:
+                await self.get_user_whitelist(user_id)
+            self.whitelist_cache.invalidate(user_id)
+        elif kind == 'system':
+            self.invalidate_system_members(user_id)
+            self.invalidate_system_switches(user_id)
+            self.non_system_cache.invalidate(user_id)
+            self.private_front_history.discard(user_id)
+
+    def format_member_name(self, member: Member, use_display_name: bool) -> str:
+        return (member.display_name or member.name) if use_display_name else member.name
+
+    @staticmethod
+    def pk_api_headers(user_config: UserConfig | None) -> dict[str, str]:
+        if user_config is not None and user_config['pluralkit_token'] is not None:
+            return {'Authorization': user_config['pluralkit_token']}
         return {}
 
-    async def get_system_member_information(self, user_id: int) -> dict[str, dict[str, Any]]:
-        headers = await self.__fetch_pk_api_headers(user_id)
-        async with ClientSession(headers=headers, base_url="https://api.pluralkit.me") as session:
-            async with session.get(url=f"/v2/systems/{user_id}/members") as resp:
-                member_data = await resp.json()
-                return {m['id']: m for m in member_data}
-
-    async def get_front_at_time(self, user_id: int, time: datetime, *, skip_auth_headers: bool) -> list[SwitchAPI] | int:
-        headers = {}
-        if not skip_auth_headers:
+    async def __fetch_pk_api_headers(self, user_id: int) -> dict[str, str]:
+        return self.pk_api_headers(await self.get_user_config(user_id))
+
+    @staticmethod
+    def __auth_scope(headers: dict[str, str]) -> str:
+        # Cache keys only ever hold a digest of the token, never the token itself.
+        token = headers.get('Authorization')
+        if token is None:
+            return ''
+        return sha256(token.encode()).hexdigest()[:16]
+
+    async def __fetch_system_members(self, user_id: int, headers: dict[str, str], deadline: float | None) -> dict[str, Member] | int:
+        auth_scope = self.__auth_scope(headers)
+        shared_key = f"roster:{user_id}:{auth_scope}"
+        shared = await self.__get_shared('roster', shared_key, unpack_roster)
+        if shared is not None:
+            self.member_cache.set((user_id, auth_scope), shared, weight=max(len(shared), 1))
+            return shared
+
+        members = await self.pluralkit.get(
+            f"/v2/systems/{user_id}/members",
+            parse=parse_members,
+            headers=headers,
+            key=user_id,
+            deadline=deadline,
+        )
+        if type(members) == int:
+            if members == PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND:
+                self.non_system_cache.set(user_id, True)
+            return members
+        self.member_cache.set((user_id, auth_scope), members, weight=max(len(members), 1))
+        await self.__set_shared(shared_key, pack_roster(members), MEMBER_CACHE_TTL)
+        await self.__snapshot_message_counts(user_id, members)
+        return members
+
+    async def __snapshot_message_counts(self, user_id: int, members: dict[str, Member]) -> None:
+        # Without a token message counts can come back hidden, which would only poison the deltas.
+        if not any(member.message_count for member in members.values()):
+            return
+
+        now = unix_time()
+        latest_query = """
+            SELECT MAX(taken_at) AS taken_at FROM MessageCountSnapshot
+                WHERE system_user_id=?
+        """
+        latest = await self.database.fetchone(latest_query, (user_id,))
+        if latest is not None and latest['taken_at'] is not None and now - latest['taken_at'] < SNAPSHOT_INTERVAL:
+            return
+
+        insert_query = """
+            INSERT INTO MessageCountSnapshot (
+                system_user_id,
+                taken_at,
+                member_ids,
+                message_counts
+            ) VALUES (?, ?, ?, ?)
+        """
+        expire_query = """
+            DELETE FROM MessageCountSnapshot
+                WHERE system_user_id=?
+                    AND taken_at<?
+        """
+        # Past the daily retention only the first snapshot of every week is kept.
+        downsample_query = """
+            DELETE FROM MessageCountSnapshot
+                WHERE system_user_id=?
+                    AND taken_at<?
+                    AND rowid NOT IN (
+                        SELECT MIN(rowid) FROM MessageCountSnapshot
+                            WHERE system_user_id=?
+                                AND taken_at<?
+                            GROUP BY CAST(taken_at / 604800 AS INTEGER)
+                    )
+        """
+        daily_cutoff = now - SNAPSHOT_DAILY_RETENTION
+        await self.database.transaction([
+            (insert_query, [(user_id, now, *pack_message_counts(members))]),
+            (expire_query, [(user_id, now - SNAPSHOT_WEEKLY_RETENTION)]),
+            (downsample_query, [(user_id, daily_cutoff, user_id, daily_cutoff)]),
+        ])
+
+    async def get_system_member_information(
+        self,
+        user_id: int,
+        *,
+        headers: dict[str, str] | None = None,
+        deadline: float | None = None,
+    ) -> dict[str, Member]:
+        members = await self.get_system_roster(user_id, headers=headers, deadline=deadline)
+        if type(members) == int:
+            return {}
+        return members
+
+    async def get_system_roster(
+        self,
+        user_id: int,
+        *,
+        headers: dict[str, str] | None = None,
+        deadline: float | None = None,
+    ) -> dict[str, Member] | int:
+        # Like get_system_member_information, but gives back PluralKit's error code rather than an empty roster.
+        if headers is None:
+            headers = await self.__fetch_pk_api_headers(user_id)
+        auth_scope = self.__auth_scope(headers)
+        cached = self.member_cache.get((user_id, auth_scope), expired=True)
+
+        def fetch() -> Awaitable[dict[str, Member] | int]:
+            return self.in_flight.do(
+                ('members', user_id, auth_scope),
+                lambda: self.__fetch_system_members(user_id, headers, deadline),
+            )
+
+        if cached is None or cached.expired:
+            try:
+                return await fetch()
+            except PluralKitUnavailable:
+                # Any roster at all beats an error while PluralKit is down.
+                if cached is None:
+                    raise
+                mark_stale('members')
+                return cached.value
+        if not cached.fresh:
+            if self.pluralkit.breaker.state != CIRCUIT_CLOSED:
+                mark_stale('members')
+            self.member_cache.revalidate((user_id, auth_scope), fetch)
+        return cached.value
+
+    async def get_system_stats(self, user_id: int) -> RosterStats | int:
+        members = await self.get_system_roster(user_id)
+        if type(members) == int:
+            return members
+        cached = self.stats_cache.get(user_id)
+        # The ranking is reused for as long as the roster it was built from is still the cached one.
+        if cached is not None and cached.value.members is members:
+            return cached.value
+        stats = RosterStats(members)
+        self.stats_cache.set(user_id, stats)
+        return stats
+
+    async def get_system_stats_since(self, user_id: int, since: float) -> tuple[RosterStats, float] | int | None:
+        members = await self.get_system_roster(user_id)
+        if type(members) == int:
+            return members
+        # Only a snapshot from before the window can serve as its baseline. A later one (like the one the
+        # fetch above may just have written) would leave out everything sent between the two.
+        query = """
+            SELECT taken_at, member_ids, message_counts FROM MessageCountSnapshot
+                WHERE system_user_id=?
+                    AND taken_at<=?
+                ORDER BY taken_at DESC
+                LIMIT 1
+        """
+        row = await self.database.fetchone(query, (user_id, since))
+        if row is None:
+            return None
+
+        baseline = unpack_message_counts(row['member_ids'], row['message_counts'])
+        deltas = {
+            member_id: Member(
+                member.id,
+                member.name,
+                member.display_name,
+                member.private,
+                max(member.message_count - baseline.get(member_id, 0), 0),
+            ) for member_id, member in members.items()
+        }
+        return RosterStats(deltas), row['taken_at']
+
+    def invalidate_system_members(self, user_id: int) -> None:
+        self.member_cache.invalidate_where(lambda key: key[0] == user_id)
+        self.fronter_cache.invalidate_where(lambda key: key[0] == user_id)
+        self.stats_cache.invalidate(user_id)
+
+    async def __fetch_switch_members(self, user_id: int, switch_id: str, headers: dict[str, str], deadline: float | None) -> dict[str, Member] | None:
+        # A single switch comes back with its members embedded, which is a fraction of the full roster.
+        members = await self.pluralkit.get(
+            f"/v2/systems/{user_id}/switches/{switch_id}",
+            parse=parse_switch_members,
+            headers=headers,
+            key=user_id,
+            deadline=deadline,
+        )
+        if type(members) == int:
+            return None
+        auth_scope = self.__auth_scope(headers)
+        for member_id, member in members.items():
+            self.fronter_cache.set((user_id, auth_scope, member_id), member)
+        return members
+
+    async def get_front_members(
+        self,
+        user_id: int,
+        switch: Switch,
+        *,
+        headers: dict[str, str] | None = None,
+        deadline: float | None = None,
+    ) -> dict[str, Member]:
+        if headers is None:
+            headers = await self.__fetch_pk_api_headers(user_id)
+        auth_scope = self.__auth_scope(headers)
+
+        # Expired rosters are left in place so that an outage can still fall back on them.
+        roster = self.member_cache.get((user_id, auth_scope), expired=True)
+        if roster is not None and not roster.expired:
+            return roster.value
+
+        members: dict[str, Member] = {}
+        for member_id in switch.members:
+            cached = self.fronter_cache.get((user_id, auth_scope, member_id))
+            if cached is None:
+                break
+            members[member_id] = cached.value
+        else:
+            return members
+
+        try:
+            fetched = await self.in_flight.do(
+                ('switch-members', user_id, auth_scope, switch.id),
+                lambda: self.__fetch_switch_members(user_id, switch.id, headers, deadline),
+            )
+        except PluralKitUnavailable:
+            stale_members: dict[str, Member] = {}
+            for member_id in switch.members:
+                cached = self.fronter_cache.get((user_id, auth_scope, member_id), expired=True)
+                if cached is None:
+                    break
+                stale_members[member_id] = cached.value
+            else:
+                mark_stale('fronters')
+                return stale_members
+            return await self.get_system_member_information(user_id, headers=headers, deadline=deadline)
+        if fetched is not None:
+            return fetched
+        return await self.get_system_member_information(user_id, headers=headers, deadline=deadline)
+
+    async def __load_switch_index(self, user_id: int, auth_scope: str) -> SwitchIndex:
+        cached = self.switch_cache.get((user_id, auth_scope))
+        if cached is not None:
+            return cached.value
+
+        shared = await self.__get_shared(
+            'switches',
+            f"switches:{user_id}:{auth_scope}",
+            lambda blob: unpack_expiring(blob, unpack_switch_index),
+        )
+        if shared is not None:
+            # Taken over with the expiry it was first fetched with, so passing an index between processes
+            # doesn't keep its oldest ranges trusted for longer than the TTL.
+            expires_at, index = shared
+            expires_in = expires_at - unix_time()
+            if expires_in > 0:
+                self.switch_cache.restore((user_id, auth_scope), index, weight=max(len(index), 1), fresh_for=expires_in, stale_for=expires_in)
+                return index
+
+        index = SwitchIndex()
+        if not auth_scope:
+            # Nothing read without a token is persisted, see ``__fetch_switch_page``.
+            self.switch_cache.set((user_id, auth_scope), index)
+            return index
+        switch_query = """
+            SELECT switch_id, unix_timestamp, members FROM SwitchHistory
+                WHERE system_user_id=?
+                    AND auth_scope=?
+        """
+        coverage_query = """
+            SELECT covered_from, covered_until FROM SwitchHistoryCoverage
+                WHERE system_user_id=?
+                    AND auth_scope=?
+                    AND fetched_at>=?
+        """
+        args = (user_id, auth_scope)
+        index.add_switches(
+            Switch(row['switch_id'], row['unix_timestamp'], tuple(map(intern, loads(row['members']))))
+            for row in await self.database.fetchall(switch_query, args)
+        )
+        for row in await self.database.fetchall(coverage_query, (*args, unix_time() - SWITCH_HISTORY_RETENTION)):
+            index.add_coverage(
+                -inf if row['covered_from'] is None else row['covered_from'],
+                row['covered_until'],
+            )
+        self.switch_cache.set((user_id, auth_scope), index, weight=max(len(index), 1))
+        return index
+
+    async def __persist_switch_page(self, user_id: int, auth_scope: str, switches: list[Switch], covered_from: float, covered_until: float) -> None:
+        delete_switches_query = """
+            DELETE FROM SwitchHistory
+                WHERE system_user_id=?
+                    AND auth_scope=?
+                    AND unix_timestamp>=?
+                    AND unix_timestamp<?
+        """
+        insert_switch_query = """
+            INSERT OR REPLACE INTO SwitchHistory (
+                system_user_id,
+                auth_scope,
+                switch_id,
+                timestamp,
+                unix_timestamp,
+                members
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """
+        prune_coverage_query = """
+            DELETE FROM SwitchHistoryCoverage
+                WHERE system_user_id=?
+                    AND auth_scope=?
+                    AND fetched_at<?
+        """
+        insert_coverage_query = """
+            INSERT INTO SwitchHistoryCoverage (
+                system_user_id,
+                auth_scope,
+                covered_from,
+                covered_until,
+                fetched_at
+            ) VALUES (?, ?, ?, ?, ?)
+        """
+        now = unix_time()
+        await self.database.transaction([
+            (delete_switches_query, [(user_id, auth_scope, covered_from, covered_until)]),
+            (insert_switch_query, [
+                (
+                    user_id,
+                    auth_scope,
+                    switch.id,
+                    unix_to_rfc3399(switch.timestamp),
+                    switch.timestamp,
+                    dumps(switch.members),
+                ) for switch in switches
+            ]),
+            (prune_coverage_query, [(user_id, auth_scope, now - SWITCH_HISTORY_RETENTION)]),
+            (insert_coverage_query, [
+                (user_id, auth_scope, None if covered_from == -inf else covered_from, covered_until, now),
+            ]),
+        ])
+
+    async def __fetch_switch_page(
+        self,
+        user_id: int,
+        headers: dict[str, str],
+        auth_scope: str,
+        index: SwitchIndex,
+        before: float,
+        deadline: float | None,
+        *,
+        persist: bool = SWITCH_CACHE_PERSIST,
+    ) -> int | None:
+        switches = await self.pluralkit.get(
+            f"/v2/systems/{user_id}/switches",
+            parse=parse_switches,
+            headers=headers,
+            params={
+                'limit': PLURALKIT_SWITCH_PAGE_SIZE,
+                'before': unix_to_rfc3399(before),
+            },
+            key=user_id,
+            deadline=deadline,
+        )
+        if type(switches) == int:
+            if switches == PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND:
+                self.non_system_cache.set(user_id, True)
+            return switches
+
+        covered_from = index.add_page(switches, before=before, limit=PLURALKIT_SWITCH_PAGE_SIZE)
+        # The index keeps the expiry it was first cached with however many pages it gains, so every range
+        # in it gets fetched again at least once per SWITCH_CACHE_TTL.
+        self.switch_cache.update((user_id, auth_scope), index, weight=max(len(index), 1))
+
+        def pack_shared() -> tuple[bytes, float] | None:
+            cached = self.switch_cache.get((user_id, auth_scope), record=False)
+            if cached is None:
+                return None
+            expires_in = cached.stale_until - monotonic()
+            return pack_expiring(pack_switch_index(cached.value), unix_time() + expires_in), expires_in
+
+        self.__schedule_shared_write(f"switches:{user_id}:{auth_scope}", pack_shared)
+        # Only history read with the system's own token is kept on disk. Without one, PluralKit is the only
+        # thing that knows whether the history is still public, so it's asked again once the cache expires.
+        if persist and auth_scope:
+            await self.__persist_switch_page(user_id, auth_scope, switches, covered_from, before)
+        return None
+
+    async def __switch_index_for(
+        self,
+        user_id: int,
+        skip_auth_headers: bool,
+        headers: dict[str, str] | None,
+    ) -> tuple[dict[str, str], str, SwitchIndex]:
+        if skip_auth_headers:
+            headers = {}
+        elif headers is None:
             headers = await self.__fetch_pk_api_headers(user_id)
-        async with ClientSession(headers=headers, base_url="https://api.pluralkit.me") as session:
-            async with session.get(
-                url=f"/v2/systems/{user_id}/switches",
-                params={
-                    'limit': 1,
-                    'before': unix_to_rfc3399(time.timestamp()),
-                },
-            ) as resp:
-                response_json: list[SwitchAPI] | dict[str, Any] = await resp.json()
-                if type(response_json) == dict:
-                    return int(response_json["code"])
-                return cast(list[SwitchAPI], response_json)
-
-    async def get_user_whitelist(self, user_id: int) -> list[int]:
+        auth_scope = self.__auth_scope(headers)
+        index = await self.in_flight.do(
+            ('switch-index', user_id, auth_scope),
+            lambda: self.__load_switch_index(user_id, auth_scope),
+        )
+        return headers, auth_scope, index
+
+    async def __cover_switches(
+        self,
+        user_id: int,
+        headers: dict[str, str],
+        auth_scope: str,
+        index: SwitchIndex,
+        start: float,
+        end: float,
+        deadline: float | None,
+    ) -> int | None:
+        # Page backwards from ``end`` until the switch that was active at ``start`` is known.
+        while True:
+            covered_from = index.contiguous_start(end)
+            if covered_from is not None and covered_from < start:
+                return None
+            page_before = end if covered_from is None else covered_from
+            error_code = await self.in_flight.do(
+                ('switches', user_id, auth_scope, page_before),
+                lambda: self.__fetch_switch_page(user_id, headers, auth_scope, index, page_before, deadline),
+            )
+            if error_code is not None:
+                return error_code
+
+    async def get_front_at_time(
+        self,
+        user_id: int,
+        time: datetime,
+        *,
+        skip_auth_headers: bool,
+        headers: dict[str, str] | None = None,
+        deadline: float | None = None,
+    ) -> list[Switch] | int:
+        if self.is_known_non_system(user_id):
+            return PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND
+
+        headers, auth_scope, index = await self.__switch_index_for(user_id, skip_auth_headers, headers)
+        # The API only sees whole seconds, so the index is queried the same way.
+        before = float(int(time.timestamp()))
+        front = index.front_at(before)
+        if front is not None:
+            return front
+
+        # Grow the nearest known range downwards first (or start from the newest page), so that
+        # nearby timestamps checked afterwards land inside one contiguous range.
+        gap_end = index.gap_end(before)
+        if gap_end is None:
+            gap_end = max(float(int(unix_time())), before)
+        try:
+            for page_before in dict.fromkeys((gap_end, before)):
+                error_code = await self.in_flight.do(
+                    ('switches', user_id, auth_scope, page_before),
+                    lambda: self.__fetch_switch_page(user_id, headers, auth_scope, index, page_before, deadline),
+                )
+                if error_code is not None:
+                    return error_code
+                front = index.front_at(before)
+                if front is not None:
+                    return front
+        except PluralKitUnavailable:
+            return self.__stale_front(index, before)
+        return []
+
+    @staticmethod
+    def __stale_front(index: SwitchIndex, before: float) -> list[Switch]:
+        front = index.last_known_front(before)
+        if front is None:
+            raise PluralKitUnavailable("PluralKit is unavailable and nothing is cached for this time.")
+        mark_stale('switches')
+        return front
+
+    async def get_fronts_at_times(
+        self,
+        user_id: int,
+        times: Iterable[datetime],
+        *,
+        skip_auth_headers: bool,
+        headers: dict[str, str] | None = None,
+        deadline: float | None = None,
+    ) -> dict[float, list[Switch]] | int:
+        if self.is_known_non_system(user_id):
+            return PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND
+
+        headers, auth_scope, index = await self.__switch_index_for(user_id, skip_auth_headers, headers)
+        fronts: dict[float, list[Switch]] = {}
+        # Newest first: the page fetched for one timestamp usually answers the next few as well.
+        for before in sorted({float(int(time.timestamp())) for time in times}, reverse=True):
+            try:
+                error_code = await self.__cover_switches(user_id, headers, auth_scope, index, before, before, deadline)
+            except PluralKitUnavailable:
+                fronts[before] = self.__stale_front(index, before)
+                continue
+            if error_code is not None:
+                return error_code
+            fronts[before] = index.front_at(before) or []
+        return fronts
+
+    async def get_switches_between(
+        self,
+        user_id: int,
+        start: datetime,
+        end: datetime,
+        *,
+        skip_auth_headers: bool,
+        headers: dict[str, str] | None = None,
+        deadline: float | None = None,
+    ) -> list[Switch] | int:
+        if self.is_known_non_system(user_id):
+            return PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND
+
+        headers, auth_scope, index = await self.__switch_index_for(user_id, skip_auth_headers, headers)
+        range_start = float(int(start.timestamp()))
+        range_end = float(int(end.timestamp()))
+        try:
+            error_code = await self.__cover_switches(user_id, headers, auth_scope, index, range_start, range_end, deadline)
+        except PluralKitUnavailable:
+            if len(index) == 0:
+                raise
+            mark_stale('switches')
+            return index.between(range_start, range_end)
+        if error_code is not None:
+            return error_code
+        return index.between(range_start, range_end)
+
+    async def sync_switch_history(
+        self,
+        user_id: int,
+        *,
+        since: float | None = None,
+        switch_count: int | None = None,
+        deadline: float | None = None,
+    ) -> SwitchIndex | int:
+        if self.is_known_non_system(user_id):
+            return PLURALKIT_API_ERROR_SYSTEM_NOT_FOUND
+
+        headers = await self.__fetch_pk_api_headers(user_id)
+        auth_scope = self.__auth_scope(headers)
+        index = await self.in_flight.do(
+            ('switch-index', user_id, auth_scope),
+            lambda: self.__load_switch_index(user_id, auth_scope),
+        )
+
+        # Pick up whatever was registered since the last sync, then page backwards only through
+        # history that isn't mirrored yet, stopping as soon as the caller has what it asked for.
+        now = float(int(unix_time()))
+        page_before = now
+        while True:
+            start = index.contiguous_start(now)
+            if start is not None:
+                if (
+                    start == -inf
+                    or (since is not None and start < since)
+                    or (switch_count is not None and index.count_since(start) >= switch_count)
+                ):
+                    return index
+                page_before = start
+            try:
+                error_code = await self.in_flight.do(
+                    ('switches', user_id, auth_scope, page_before),
+                    lambda: self.__fetch_switch_page(user_id, headers, auth_scope, index, page_before, deadline, persist=True),
+                )
+            except PluralKitUnavailable:
+                if len(index) == 0:
+                    raise
+                mark_stale('switches')
+                return index
+            if error_code is not None:
+                return error_code
+
+    def is_known_non_system(self, user_id: int) -> bool:
+        return self.non_system_cache.get(user_id) is not None
+
+    def invalidate_system_switches(self, user_id: int) -> None:
+        self.switch_cache.invalidate_where(lambda key: key[0] == user_id)
+
+    async def __load_private_front_history(self) -> None:
+        query = """
+            SELECT system_user_id FROM PrivateFrontHistory
+        """
+        rows = await self.database.fetchall(query)
+        self.private_front_history = {row['system_user_id'] for row in rows}
+
+    def front_history_requires_auth(self, user_id: int) -> bool:
+        return user_id in self.private_front_history
+
+    async def mark_front_history_private(self, user_id: int) -> None:
+        if user_id in self.private_front_history:
+            return
+        self.private_front_history.add(user_id)
+        query = """
+            INSERT OR IGNORE INTO PrivateFrontHistory (
+                system_user_id
+            ) VALUES (?)
+        """
+        args = (user_id,)
+        await self.database.execute(query, args)
+
+    async def forget_front_history_private(self, user_id: int) -> None:
+        if user_id not in self.private_front_history:
+            return
+        self.private_front_history.discard(user_id)
+        query = """
+            DELETE FROM PrivateFrontHistory
+                WHERE system_user_id=?
+        """
+        args = (user_id,)
+        await self.database.execute(query, args)
+
+    async def __load_user_whitelist(self, user_id: int) -> set[int]:
         query = """
             SELECT whitelisted_user_id FROM UserWhitelist
                 WHERE whitelist_owner_user_id = ?
         """
         args = (user_id,)
-        async with aio_connect(DATABASE_NAME) as db:
-            db.row_factory = Row
-            rows = await db.execute_fetchall(query, args)
-            rows = cast(list[dict[str, str]] | None, rows)
-            if rows is None:
-                return []
-        return [int(row['whitelisted_user_id']) for row in rows]
+        rows = await self.database.fetchall(query, args)
+        whitelist = {row['whitelisted_user_id'] for row in rows}
+        self.whitelist_cache.set(user_id, whitelist, weight=max(len(whitelist), 1))
+        return whitelist
+
+    async def get_user_whitelist(self, user_id: int) -> set[int]:
+        cached = self.whitelist_cache.get(user_id)
+        if cached is not None:
+            return cached.value
+        return await self.in_flight.do(
+            ('whitelist', user_id),
+            lambda: self.__load_user_whitelist(user_id),
+        )
+
+    async def is_user_whitelisted(self, whitelist_owner_user_id: int, whitelisted_user_id: int) -> bool:
+        cached = self.whitelist_cache.get(whitelist_owner_user_id)
+        if cached is not None:
+            return whitelisted_user_id in cached.value
+
+        query = """
+            SELECT EXISTS(
+                SELECT 1 FROM UserWhitelist
+                    WHERE whitelist_owner_user_id=?
+                        AND whitelisted_user_id=?
+            ) AS whitelisted
+        """
+        args = (whitelist_owner_user_id, whitelisted_user_id)
+        row = await self.database.fetchone(query, args)
+        assert row is not None
+        return bool(row['whitelisted'])
+
+    async def __update_cached_whitelist(
+        self,
+        whitelist_owner_user_id: int,
+        *,
+        added: Iterable[int] = (),
+        removed: Iterable[int] = (),
+    ) -> None:
+        await self.__publish_invalidation('whitelist', whitelist_owner_user_id)
+        # A load that started before the write may have read the old rows, so it's waited on and patched too.
+        if (
+            whitelist_owner_user_id not in self.whitelist_cache
+            and ('whitelist', whitelist_owner_user_id) not in self.in_flight
+        ):
+            return
+        whitelist = await self.get_user_whitelist(whitelist_owner_user_id)
+        whitelist.difference_update(removed)
+        whitelist.update(added)
+        self.whitelist_cache.set(whitelist_owner_user_id, whitelist, weight=max(len(whitelist), 1))
 
     async def add_user_to_whitelist(self, whitelist_owner_user_id: int, whitelisted_user_id: int) -> None:
         query = """
@@ -88,10 +1005,8 @@ class Service:
             ) VALUES (?, ?)
         """
         args = (whitelist_owner_user_id, whitelisted_user_id)
-        async with aio_connect(DATABASE_NAME) as db:
-            db.row_factory = Row
-            await db.execute_insert(query, args)
-            await db.commit()
+        await self.database.execute(query, args)
+        await self.__update_cached_whitelist(whitelist_owner_user_id, added=(whitelisted_user_id,))
 
     async def remove_user_from_whitelist(self, whitelist_owner_user_id: int, whitelisted_user_id: int) -> None:
         query = """
@@ -100,10 +1015,48 @@ class Service:
                     AND whitelisted_user_id=?
         """
         args = (whitelist_owner_user_id, whitelisted_user_id)
-        async with aio_connect(DATABASE_NAME) as db:
-            db.row_factory = Row
-            await db.execute(query, args)
-            await db.commit()
+        await self.database.execute(query, args)
+        await self.__update_cached_whitelist(whitelist_owner_user_id, removed=(whitelisted_user_id,))
+
+    async def add_users_to_whitelist(self, whitelist_owner_user_id: int, user_ids: Iterable[int]) -> set[int]:
+        whitelist = await self.get_user_whitelist(whitelist_owner_user_id)
+        added = set(user_ids) - whitelist
+        added.discard(whitelist_owner_user_id)
+        if len(added) == 0:
+            return added
+
+        query = """
+            INSERT OR IGNORE INTO UserWhitelist (
+                whitelist_owner_user_id,
+                whitelisted_user_id
+            ) VALUES (?, ?)
+        """
+        await self.database.executemany(query, [(whitelist_owner_user_id, user_id) for user_id in sorted(added)])
+        await self.__update_cached_whitelist(whitelist_owner_user_id, added=added)
+        return added
+
+    async def remove_users_from_whitelist(self, whitelist_owner_user_id: int, user_ids: Iterable[int]) -> set[int]:
+        whitelist = await self.get_user_whitelist(whitelist_owner_user_id)
+        removed = whitelist.intersection(user_ids)
+        if len(removed) == 0:
+            return removed
+
+        query = """
+            DELETE FROM UserWhitelist
+                WHERE whitelist_owner_user_id=?
+                    AND whitelisted_user_id=?
+        """
+        await self.database.executemany(query, [(whitelist_owner_user_id, user_id) for user_id in sorted(removed)])
+        await self.__update_cached_whitelist(whitelist_owner_user_id, removed=removed)
+        return removed
+
+    async def iterate_user_whitelist(self, user_id: int) -> AsyncIterator[int]:
+        query = """
+            SELECT whitelisted_user_id FROM UserWhitelist
+                WHERE whitelist_owner_user_id = ?
+        """
+        async for row in self.database.iterate(query, (user_id,)):
+            yield row['whitelisted_user_id']
 
     async def set_whitelist_enabled(self, user_id: int, whitelist_enabled: bool) -> None:
         query = """
@@ -115,10 +1068,8 @@ class Service:
                 DO UPDATE SET whitelist_enabled=?;
         """
         args = (user_id, whitelist_enabled, whitelist_enabled)
-        async with aio_connect(DATABASE_NAME) as db:
-            db.row_factory = Row
-            await db.execute(query, args)
-            await db.commit()
+        await self.database.execute(query, args)
+        await self.__update_cached_config(user_id, whitelist_enabled=whitelist_enabled)
 
     async def set_prefer_display_names(self, user_id: int, prefer_display_names: bool) -> None:
         query = """
@@ -130,10 +1081,8 @@ class Service:
                 DO UPDATE SET prefer_display_names=?;
         """
         args = (user_id, prefer_display_names, prefer_display_names)
-        async with aio_connect(DATABASE_NAME) as db:
-            db.row_factory = Row
-            await db.execute(query, args)
-            await db.commit()
+        await self.database.execute(query, args)
+        await self.__update_cached_config(user_id, prefer_display_names=prefer_display_names)
 
     async def set_pluralkit_token(self, user_id: int, pluralkit_token: str | None) -> None:
         query = """
@@ -145,10 +1094,19 @@ class Service:
                 DO UPDATE SET pluralkit_token=?;
         """
         args = (user_id, pluralkit_token, pluralkit_token)
-        async with aio_connect(DATABASE_NAME) as db:
-            db.row_factory = Row
-            await db.execute(query, args)
-            await db.commit()
+        await self.database.execute(query, args)
+        await self.__update_cached_config(user_id, pluralkit_token=pluralkit_token)
+        # Counts read with and without a token differ (private members), so older snapshots would skew the deltas.
+        delete_snapshots_query = """
+            DELETE FROM MessageCountSnapshot
+                WHERE system_user_id=?
+        """
+        await self.database.execute(delete_snapshots_query, args[:1])
+        await self.__publish_invalidation('system', user_id)
+        self.invalidate_system_members(user_id)
+        self.invalidate_system_switches(user_id)
+        self.non_system_cache.invalidate(user_id)
+        await self.forget_front_history_private(user_id)
 
     async def set_front_member_visibility(self, user_id: int, front_member_visibility: FrontMemberVisibility) -> None:
         query = """
@@ -160,31 +1118,71 @@ class Service:
                 DO UPDATE SET front_member_visibility=?;
         """
         args = (user_id, front_member_visibility, front_member_visibility)
-        async with aio_connect(DATABASE_NAME) as db:
-            db.row_factory = Row
-            await db.execute(query, args)
-            await db.commit()
+        await self.database.execute(query, args)
+        await self.__update_cached_config(user_id, front_member_visibility=front_member_visibility)
 
-    async def get_user_config(self, user_id: int) -> UserConfig | None:
+    async def get_check_context(self, user_id: int, viewer_user_id: int) -> tuple[UserConfig | None, bool]:
+        user_config = await self.get_user_config(user_id)
+        # The whitelist is only consulted when it's enabled, so a disabled one lets everyone through.
+        if viewer_user_id == user_id or user_config is None or not user_config['whitelist_enabled']:
+            return user_config, True
+        # Owners with their whitelist on get it loaded once, after which every check is a set lookup.
+        return user_config, viewer_user_id in await self.get_user_whitelist(user_id)
+
+    def is_known_whitelisted(self, user_id: int, viewer_user_id: int) -> bool:
+        # Answered from the caches alone: False whenever the viewer might still be turned away.
+        if viewer_user_id == user_id:
+            return True
+        cached_config = self.user_config_cache.get(user_id)
+        if cached_config is None:
+            return False
+        if cached_config.value is None or not cached_config.value['whitelist_enabled']:
+            return True
+        cached_whitelist = self.whitelist_cache.get(user_id)
+        return cached_whitelist is not None and viewer_user_id in cached_whitelist.value
+
+    async def __load_user_config(self, user_id: int) -> UserConfig | None:
         query = """
             SELECT * FROM UserConfig
                 WHERE discord_user_id=?
         """
-        args = (str(user_id),)
-        async with aio_connect(DATABASE_NAME) as db:
-            db.row_factory = Row
-            return cast(
-                UserConfig | None,
-                (await (await db.execute(query, args)).fetchone())
-            )
+        args = (user_id,)
+        row = await self.database.fetchone(query, args)
+        user_config = None if row is None else cast(UserConfig, dict(row))
+        self.user_config_cache.set(user_id, user_config)
+        return user_config
+
+    async def get_user_config(self, user_id: int) -> UserConfig | None:
+        cached = self.user_config_cache.get(user_id)
+        if cached is not None:
+            return cached.value
+        return await self.in_flight.do(
+            ('user-config', user_id),
+            lambda: self.__load_user_config(user_id),
+        )
+
+    async def __update_cached_config(self, user_id: int, **changes: Any) -> None:
+        self.config_writes += 1
+        await self.__publish_invalidation('config', user_id)
+        # Cached configs are replaced rather than mutated, so a reader never sees a half-applied change.
+        if user_id not in self.user_config_cache and ('user-config', user_id) not in self.in_flight:
+            return
+        user_config = await self.get_user_config(user_id)
+        if user_config is None:
+            # The upsert just created the row with its column defaults, which only the database knows.
+            self.user_config_cache.invalidate(user_id)
+            return
+        self.user_config_cache.set(user_id, cast(UserConfig, {**user_config, **changes}))
 
     async def delete_config(self, user_id: int) -> None:
         query = """
             DELETE FROM UserConfig
                 WHERE discord_user_id=?
         """
-        args = (str(user_id),)
-        async with aio_connect(DATABASE_NAME) as db:
-            db.row_factory = Row
-            await db.execute(query, args)
-            await db.commit()
+        args = (user_id,)
+        await self.database.execute(query, args)
+        self.config_writes += 1
+        await self.__publish_invalidation('config', user_id)
+        if ('user-config', user_id) in self.in_flight:
+            await self.get_user_config(user_id)
+        self.user_config_cache.set(user_id, None)
@@ -0,0 +1,49 @@
+from asyncio import Task, create_task, shield
+from collections.abc import Awaitable, Callable, Hashable
+
+
+__all__: tuple[str, ...] = (
+    "SingleFlight",
+)
+
+
+class SingleFlight[K: Hashable, V]:
+    __slots__: tuple[str, ...] = (
+        'calls',
+        'coalesced',
+        '_in_flight',
+    )
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: dict[K, Task[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._in_flight
+
+    async def do(self, key: K, factory: Callable[[], Awaitable[V]]) -> V:
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await shield(task)
+
+        self.calls += 1
+
+        async def run() -> V:
+            return await factory()
+
+        # The shared call runs as its own task so one waiter being cancelled doesn't cancel it for the rest.
+        task = create_task(run())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return await shield(task)
+
+    def _forget(self, key: K, task: Task[V]) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()
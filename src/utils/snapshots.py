@@ -0,0 +1,27 @@
+from array import array
+
+from utils.types import Member
+
+
+__all__: tuple[str, ...] = (
+    "pack_message_counts",
+    "unpack_message_counts",
+)
+
+
+# Snapshots are stored columnar: one blob of NUL separated member ids and one packed array of counts.
+_COUNT_TYPECODE: str = 'q'
+
+
+def pack_message_counts(members: dict[str, Member]) -> tuple[bytes, bytes]:
+    member_ids = '\0'.join(members.keys()).encode()
+    counts = array(_COUNT_TYPECODE, (member.message_count for member in members.values()))
+    return member_ids, counts.tobytes()
+
+
+def unpack_message_counts(member_ids: bytes, message_counts: bytes) -> dict[str, int]:
+    if not member_ids:
+        return {}
+    counts = array(_COUNT_TYPECODE)
+    counts.frombytes(message_counts)
+    return dict(zip(member_ids.decode().split('\0'), counts))
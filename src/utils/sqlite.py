@@ -1,8 +1,9 @@
+from collections.abc import Callable
 from sys import exit as sys_exit
-from sqlite3 import Connection
-from sqlite3 import Connection, Error
+from sqlite3 import Connection, Cursor, Error
 from sqlite3 import connect as sync_connect
 
+from utils.constants import DATABASE_BUSY_TIMEOUT
 from utils.env import DATABASE_NAME
 
 
@@ -12,77 +13,283 @@ __all__: tuple[str, ...] = (
 )
 
 
+type _Migration = Callable[[Cursor], None]
+
+
 sqlite_connection: bool | Connection = False
 
 
-def check_sqlite_connection() -> None:
-    try:
-        sqlite_connection = sync_connect(DATABASE_NAME)
-        cursor = sqlite_connection.cursor()
-        print("Database created and Successfully Connected to SQLite")
+def _table_exists(cursor: Cursor, table: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?;", (table,))
+    return cursor.fetchone() is not None
 
-        sqlite_select_query = "select sqlite_version();"
-        cursor.execute(sqlite_select_query)
-        record = cursor.fetchall()
-        print(f"SQLite Database Version is: {record}")
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS UserPKToken (
-                discord_user_id     TEXT NOT NULL,
-                pluralkit_token     TEXT
-            );
-        """)
+def _column_names(cursor: Cursor, table: str) -> set[str]:
+    cursor.execute(f"PRAGMA table_info({table});")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _baseline_schema(cursor: Cursor) -> None:
+    # Brings a database from any earlier release (which never recorded a version) up to the last unversioned schema.
+    if not _table_exists(cursor, "UserConfig"):
+        if _table_exists(cursor, "UserPKToken"):
+            cursor.execute("""
+                ALTER TABLE UserPKToken RENAME TO UserConfig;
+            """)
+        else:
+            cursor.execute("""
+                CREATE TABLE UserConfig (
+                    discord_user_id     TEXT NOT NULL,
+                    pluralkit_token     TEXT
+                );
+            """)
+    # Older releases recreated an empty UserPKToken on every start after it had been renamed.
+    cursor.execute("""
+        DROP TABLE IF EXISTS UserPKToken;
+    """)
 
+    config_columns = _column_names(cursor, "UserConfig")
+    if "whitelist_enabled" not in config_columns:
         cursor.execute("""
-            CREATE UNIQUE INDEX IF NOT EXISTS unique_discord_user_id
-                ON UserPKToken(discord_user_id);
+            ALTER TABLE UserConfig ADD COLUMN
+                whitelist_enabled BOOLEAN NOT NULL DEFAULT true;
         """)
-
+    if "prefer_display_names" not in config_columns:
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS UserWhitelist (
-                whitelist_owner_user_id     TEXT NOT NULL,
-                whitelisted_user_id         TEXT NOT NULL
-            );
+            ALTER TABLE UserConfig ADD COLUMN
+                prefer_display_names BOOLEAN NOT NULL DEFAULT true;
         """)
-
+    if "front_member_visibility" not in config_columns:
         cursor.execute("""
-            CREATE UNIQUE INDEX IF NOT EXISTS unique_whitelist_span
-                ON UserWhitelist(whitelist_owner_user_id, whitelisted_user_id);
+            ALTER TABLE UserConfig ADD COLUMN
+                front_member_visibility INTEGER NOT NULL DEFAULT 1;
         """)
 
-        # Migrations
-        try:
-            cursor.execute("""
-                ALTER TABLE UserPKToken RENAME TO UserConfig;
-            """)
-        except Error:
-            pass
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS UserWhitelist (
+            whitelist_owner_user_id     TEXT NOT NULL,
+            whitelisted_user_id         TEXT NOT NULL
+        );
+    """)
 
-        try:
-            cursor.execute("""
-                ALTER TABLE UserConfig ADD COLUMN
-                    whitelist_enabled BOOLEAN NOT NULL DEFAULT true;
-            """)
-        except Error:
-            pass
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SwitchHistory (
+            system_user_id      TEXT NOT NULL,
+            auth_scope          TEXT NOT NULL,
+            switch_id           TEXT NOT NULL,
+            timestamp           TEXT NOT NULL,
+            unix_timestamp      REAL NOT NULL,
+            members             TEXT NOT NULL
+        );
+    """)
 
-        try:
-            cursor.execute("""
-                ALTER TABLE UserConfig ADD COLUMN
-                    prefer_display_names BOOLEAN NOT NULL DEFAULT true;
-            """)
-        except Error:
-            pass
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SwitchHistoryCoverage (
+            system_user_id      TEXT NOT NULL,
+            auth_scope          TEXT NOT NULL,
+            covered_from        REAL,
+            covered_until       REAL NOT NULL,
+            fetched_at          REAL NOT NULL
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS PrivateFrontHistory (
+            system_user_id      TEXT NOT NULL
+        );
+    """)
 
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS MessageCountSnapshot (
+            system_user_id      TEXT NOT NULL,
+            taken_at            REAL NOT NULL,
+            member_ids          BLOB NOT NULL,
+            message_counts      BLOB NOT NULL
+        );
+    """)
+
+
+def _integer_snowflakes(cursor: Cursor) -> None:
+    # Discord IDs become INTEGER keys, and each table is keyed the way it is looked up.
+    cursor.execute("""
+        CREATE TABLE UserConfig_new (
+            discord_user_id             INTEGER PRIMARY KEY,
+            pluralkit_token             TEXT,
+            whitelist_enabled           BOOLEAN NOT NULL DEFAULT true,
+            prefer_display_names        BOOLEAN NOT NULL DEFAULT true,
+            front_member_visibility     INTEGER NOT NULL DEFAULT 1
+        );
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO UserConfig_new
+            SELECT
+                CAST(discord_user_id AS INTEGER),
+                pluralkit_token,
+                whitelist_enabled,
+                prefer_display_names,
+                front_member_visibility
+            FROM UserConfig
+            ORDER BY rowid;
+    """)
+
+    # The primary key doubles as the (owner, user) covering index for point lookups and listing.
+    cursor.execute("""
+        CREATE TABLE UserWhitelist_new (
+            whitelist_owner_user_id     INTEGER NOT NULL,
+            whitelisted_user_id         INTEGER NOT NULL,
+            PRIMARY KEY (whitelist_owner_user_id, whitelisted_user_id)
+        ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO UserWhitelist_new
+            SELECT CAST(whitelist_owner_user_id AS INTEGER), CAST(whitelisted_user_id AS INTEGER)
+            FROM UserWhitelist;
+    """)
+
+    # Clustered on the key the index loader and page writes scan by, so a system's rows sit together.
+    cursor.execute("""
+        CREATE TABLE SwitchHistory_new (
+            system_user_id      INTEGER NOT NULL,
+            auth_scope          TEXT NOT NULL,
+            switch_id           TEXT NOT NULL,
+            timestamp           TEXT NOT NULL,
+            unix_timestamp      REAL NOT NULL,
+            members             TEXT NOT NULL,
+            PRIMARY KEY (system_user_id, auth_scope, unix_timestamp, switch_id)
+        ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO SwitchHistory_new
+            SELECT CAST(system_user_id AS INTEGER), auth_scope, switch_id, timestamp, unix_timestamp, members
+            FROM SwitchHistory;
+    """)
+
+    cursor.execute("""
+        CREATE TABLE SwitchHistoryCoverage_new (
+            system_user_id      INTEGER NOT NULL,
+            auth_scope          TEXT NOT NULL,
+            covered_from        REAL,
+            covered_until       REAL NOT NULL,
+            fetched_at          REAL NOT NULL
+        );
+    """)
+    cursor.execute("""
+        INSERT INTO SwitchHistoryCoverage_new
+            SELECT CAST(system_user_id AS INTEGER), auth_scope, covered_from, covered_until, fetched_at
+            FROM SwitchHistoryCoverage;
+    """)
+
+    cursor.execute("""
+        CREATE TABLE PrivateFrontHistory_new (
+            system_user_id      INTEGER PRIMARY KEY
+        );
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO PrivateFrontHistory_new
+            SELECT CAST(system_user_id AS INTEGER)
+            FROM PrivateFrontHistory;
+    """)
+
+    # Keeps its rowid, which the weekly downsampling uses to pick one snapshot per week.
+    cursor.execute("""
+        CREATE TABLE MessageCountSnapshot_new (
+            system_user_id      INTEGER NOT NULL,
+            taken_at            REAL NOT NULL,
+            member_ids          BLOB NOT NULL,
+            message_counts      BLOB NOT NULL
+        );
+    """)
+    cursor.execute("""
+        INSERT INTO MessageCountSnapshot_new
+            SELECT CAST(system_user_id AS INTEGER), taken_at, member_ids, message_counts
+            FROM MessageCountSnapshot
+            ORDER BY rowid;
+    """)
+
+    for table in (
+        "UserConfig",
+        "UserWhitelist",
+        "SwitchHistory",
+        "SwitchHistoryCoverage",
+        "PrivateFrontHistory",
+        "MessageCountSnapshot",
+    ):
+        cursor.execute(f"DROP TABLE {table};")
+        cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table};")
+
+
+def _covering_indexes(cursor: Cursor) -> None:
+    # Coverage loads read both range columns for a (system, scope) filtered by fetched_at.
+    cursor.execute("""
+        CREATE INDEX switch_history_coverage_system
+            ON SwitchHistoryCoverage(system_user_id, auth_scope, fetched_at, covered_from, covered_until);
+    """)
+
+    # Answers MAX(taken_at) and the nearest-snapshot search without touching the blobs.
+    cursor.execute("""
+        CREATE INDEX message_count_snapshot_system
+            ON MessageCountSnapshot(system_user_id, taken_at);
+    """)
+
+
+def _drop_unauthenticated_switch_history(cursor: Cursor) -> None:
+    # History read without a token is no longer persisted, since it would outlive the system making it private.
+    cursor.execute("""
+        DELETE FROM SwitchHistory
+            WHERE auth_scope='';
+    """)
+    cursor.execute("""
+        DELETE FROM SwitchHistoryCoverage
+            WHERE auth_scope='';
+    """)
+
+
+# Append only: a migration's position is the user_version it brings the database to.
+_MIGRATIONS: tuple[_Migration, ...] = (
+    _baseline_schema,
+    _integer_snowflakes,
+    _covering_indexes,
+    _drop_unauthenticated_switch_history,
+)
+
+
+def _migrate(connection: Connection) -> None:
+    cursor = connection.cursor()
+    while True:
+        # The version is read under the write lock, so concurrently starting workers never apply a step twice.
+        cursor.execute("BEGIN IMMEDIATE;")
+        cursor.execute("PRAGMA user_version;")
+        (version,) = cursor.fetchone()
+        if version >= len(_MIGRATIONS):
+            cursor.execute("COMMIT;")
+            break
+        migration = _MIGRATIONS[version]
         try:
-            cursor.execute("""
-                ALTER TABLE UserConfig ADD COLUMN
-                    front_member_visibility INTEGER NOT NULL DEFAULT 1;
-            """)
-        except Error:
-            pass
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version={version + 1};")
+            cursor.execute("COMMIT;")
+        except BaseException:
+            cursor.execute("ROLLBACK;")
+            raise
+        print(f"Applied database migration {version + 1} ({migration.__name__})")
+    cursor.close()
 
+
+def check_sqlite_connection() -> None:
+    try:
+        # isolation_level=None so each migration controls its own transaction.
+        sqlite_connection = sync_connect(DATABASE_NAME, isolation_level=None, timeout=DATABASE_BUSY_TIMEOUT / 1000)
+        cursor = sqlite_connection.cursor()
+        print("Database created and Successfully Connected to SQLite")
+
+        sqlite_select_query = "select sqlite_version();"
+        cursor.execute(sqlite_select_query)
+        record = cursor.fetchall()
+        print(f"SQLite Database Version is: {record}")
         cursor.close()
+
+        _migrate(sqlite_connection)
+        sqlite_connection.close()
     except Error as error:
         print(f"[SQLite Error] Error while connecting to SQLite {error}")
         sys_exit(-1)
@@ -0,0 +1,26 @@
+from contextvars import ContextVar
+
+from utils.metrics import metrics
+
+
+__all__: tuple[str, ...] = (
+    "track_staleness",
+    "mark_stale",
+)
+
+
+_stale_sources: ContextVar[set[str] | None] = ContextVar('stale_sources', default=None)
+
+
+def track_staleness() -> set[str]:
+    # Tasks copy the context they're created in, so anything they mark still lands in this set.
+    sources: set[str] = set()
+    _stale_sources.set(sources)
+    return sources
+
+
+def mark_stale(source: str) -> None:
+    metrics.increment('stale_responses_total', source=source)
+    sources = _stale_sources.get()
+    if sources is not None:
+        sources.add(source)
@@ -0,0 +1,73 @@
+from collections.abc import Callable
+from heapq import nsmallest
+from math import ceil
+
+from utils.constants import SYSTEM_STATS_PAGE_SIZE
+from utils.types import Member
+
+
+__all__: tuple[str, ...] = (
+    "RosterStats",
+)
+
+
+def _rank_key(member: Member) -> tuple[int, str]:
+    # Members with equal message counts are ordered by id, so ties are stable across pages.
+    return (-member.message_count, member.id)
+
+
+class RosterStats:
+    __slots__: tuple[str, ...] = (
+        'members',
+        'total_messages',
+        'count_width',
+        '_ranked',
+        '_fully_ranked',
+        '_pages',
+    )
+
+    def __init__(self, members: dict[str, Member]) -> None:
+        self.members = members
+        self.total_messages = 0
+        highest = 0
+        for member in members.values():
+            self.total_messages += member.message_count
+            if member.message_count > highest:
+                highest = member.message_count
+        self.count_width = len(str(highest))
+        self._ranked: list[Member] = []
+        self._fully_ranked = False
+        self._pages: dict[tuple[int, bool], str] = {}
+
+    @property
+    def page_count(self) -> int:
+        return ceil(len(self.members) / SYSTEM_STATS_PAGE_SIZE)
+
+    def ranked(self, limit: int) -> list[Member]:
+        if len(self._ranked) < limit and not self._fully_ranked:
+            # The first page only needs the top of the ranking. Once anyone pages past what the
+            # heap selected, sort everything once and serve every later page from that.
+            if not self._ranked and limit * 4 < len(self.members):
+                self._ranked = nsmallest(limit, self.members.values(), key=_rank_key)
+            else:
+                self._ranked = sorted(self.members.values(), key=_rank_key)
+                self._fully_ranked = True
+        return self._ranked[:limit]
+
+    def render_page(self, page: int, use_display_name: bool, format_name: Callable[[Member, bool], str]) -> str:
+        cached = self._pages.get((page, use_display_name))
+        if cached is not None:
+            return cached
+
+        start = (page - 1) * SYSTEM_STATS_PAGE_SIZE
+        lines: list[str] = []
+        for member in self.ranked(start + SYSTEM_STATS_PAGE_SIZE)[start:]:
+            percentage = (member.message_count / self.total_messages) * 100 if self.total_messages else 0.0
+            lines.append(
+                f"`[{member.id}]` `{str(member.message_count).rjust(self.count_width)} messages` "
+                f"`{str(round(percentage, 2)).rjust(5)}%` "
+                f"{format_name(member, use_display_name)}"
+            )
+        rendered = '\n'.join(lines)
+        self._pages[(page, use_display_name)] = rendered
+        return rendered
@@ -0,0 +1,137 @@
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Iterable
+from heapq import merge
+from itertools import pairwise
+from math import inf
+from operator import attrgetter
+
+from utils.types import Switch
+
+
+__all__: tuple[str, ...] = (
+    "SwitchIndex",
+)
+
+
+_timestamp = attrgetter('timestamp')
+
+
+class SwitchIndex:
+    # ``coverage`` holds sorted, disjoint ``[start, end)`` ranges of time in which every switch is known.
+    __slots__: tuple[str, ...] = (
+        'timestamps',
+        'switches',
+        'coverage',
+        '_ids',
+    )
+
+    def __init__(self) -> None:
+        self.timestamps: list[float] = []
+        self.switches: list[Switch] = []
+        self.coverage: list[tuple[float, float]] = []
+        self._ids: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.switches)
+
+    def front_at(self, timestamp: float) -> list[Switch] | None:
+        for start, end in self.coverage:
+            if start < timestamp <= end:
+                position = bisect_left(self.timestamps, timestamp)
+                if position == 0:
+                    return []
+                return [self.switches[position - 1]]
+        return None
+
+    def last_known_front(self, timestamp: float) -> list[Switch] | None:
+        # Best effort for when the gaps can't be filled: the newest switch known from before ``timestamp``.
+        front = self.front_at(timestamp)
+        if front is not None:
+            return front
+        position = bisect_left(self.timestamps, timestamp)
+        if position == 0:
+            return None
+        return [self.switches[position - 1]]
+
+    def contiguous_start(self, end: float) -> float | None:
+        for start, range_end in self.coverage:
+            if start < end <= range_end:
+                return start
+        return None
+
+    def count_since(self, timestamp: float) -> int:
+        return len(self.timestamps) - bisect_left(self.timestamps, timestamp)
+
+    def newest(self, offset: int, count: int) -> list[Switch]:
+        stop = max(len(self.switches) - offset, 0)
+        return self.switches[max(stop - count, 0):stop][::-1]
+
+    def between(self, start: float, end: float) -> list[Switch]:
+        # The switch already active at ``start`` comes first, followed by every switch up to ``end``.
+        first = max(bisect_left(self.timestamps, start) - 1, 0)
+        last = bisect_left(self.timestamps, end)
+        return self.switches[first:last]
+
+    def time_fronted(self, start: float, end: float) -> dict[str, float]:
+        # Include the switch that was already active when the range starts.
+        first = max(bisect_right(self.timestamps, start) - 1, 0)
+        last = bisect_left(self.timestamps, end)
+        switches = self.switches[first:last]
+        if not switches:
+            return {}
+
+        bounds = [min(max(timestamp, start), end) for timestamp in self.timestamps[first:last]]
+        bounds.append(end)
+        totals: dict[str, float] = {}
+        for switch, duration in zip(switches, [b - a for a, b in pairwise(bounds)]):
+            for member_id in switch.members:
+                totals[member_id] = totals.get(member_id, 0.0) + duration
+        return totals
+
+    def gap_end(self, timestamp: float) -> float | None:
+        for start, _ in self.coverage:
+            if start >= timestamp:
+                return start
+        return None
+
+    def add_page(self, switches: list[Switch], *, before: float, limit: int) -> float:
+        # A short page means there is nothing older left to fetch.
+        start = -inf
+        if len(switches) >= limit:
+            start = min(s.timestamp for s in switches)
+        # The page is authoritative for its range, so drop anything there that was since edited away.
+        self._drop_range(start, before)
+        self.add_switches(switches)
+        self.add_coverage(start, before)
+        return start
+
+    def add_switches(self, switches: Iterable[Switch]) -> None:
+        new_switches: list[Switch] = []
+        for switch in switches:
+            if switch.id in self._ids:
+                continue
+            self._ids.add(switch.id)
+            new_switches.append(switch)
+        if not new_switches:
+            return
+        new_switches.sort(key=_timestamp)
+        self.switches = list(merge(self.switches, new_switches, key=_timestamp))
+        self.timestamps = [switch.timestamp for switch in self.switches]
+
+    def add_coverage(self, start: float, end: float) -> None:
+        insort(self.coverage, (start, end))
+        merged: list[tuple[float, float]] = []
+        for range_start, range_end in self.coverage:
+            if merged and range_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+            else:
+                merged.append((range_start, range_end))
+        self.coverage = merged
+
+    def _drop_range(self, start: float, end: float) -> None:
+        low = bisect_left(self.timestamps, start)
+        high = bisect_left(self.timestamps, end)
+        for switch in self.switches[low:high]:
+            self._ids.discard(switch.id)
+        del self.timestamps[low:high]
+        del self.switches[low:high]
@@ -1,4 +1,7 @@
-from typing import Literal, TypedDict
+from sys import intern
+from typing import Any, Literal, Self, TypedDict
+
+from utils.functions import format_timestamp
 
 
 __all__: tuple[str, ...] = (
@@ -7,6 +10,8 @@ __all__: tuple[str, ...] = (
     "PUBLIC_TO_EVERYONE",
     "SwitchAPI",
     "FrontMemberVisibility",
+    "Member",
+    "Switch",
 )
 
 
@@ -19,8 +24,8 @@ type FrontMemberVisibility = Literal[0, 1, 2]
 
 
 class UserConfig(TypedDict):
-    discord_user_id: str
-    pluralkit_token: str
+    discord_user_id: int
+    pluralkit_token: str | None
     whitelist_enabled: bool
     prefer_display_names: bool
     front_member_visibility: FrontMemberVisibility
@@ -30,3 +35,52 @@ class SwitchAPI(TypedDict):
     id: str
     timestamp: str
     members: list[str]
+
+
+class Member:
+    # Only the fields the cogs read are kept, so cached rosters stay small.
+    __slots__: tuple[str, ...] = (
+        'id',
+        'name',
+        'display_name',
+        'private',
+        'message_count',
+    )
+
+    def __init__(self, id: str, name: str, display_name: str | None, private: bool, message_count: int) -> None:
+        self.id = id
+        self.name = name
+        self.display_name = display_name
+        self.private = private
+        self.message_count = message_count
+
+    @classmethod
+    def from_api(cls, data: dict[str, Any]) -> Self:
+        return cls(
+            id=intern(data['id']),
+            name=data['name'],
+            display_name=data.get('display_name'),
+            private=(data.get('privacy') or {}).get('visibility', 'public') != 'public',
+            message_count=data.get('message_count') or 0,
+        )
+
+
+class Switch:
+    __slots__: tuple[str, ...] = (
+        'id',
+        'timestamp',
+        'members',
+    )
+
+    def __init__(self, id: str, timestamp: float, members: tuple[str, ...]) -> None:
+        self.id = id
+        self.timestamp = timestamp
+        self.members = members
+
+    @classmethod
+    def from_api(cls, data: SwitchAPI) -> Self:
+        return cls(
+            id=data['id'],
+            timestamp=format_timestamp(data['timestamp']).timestamp(),
+            members=tuple(intern(member_id) for member_id in data['members']),
+        )